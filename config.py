@@ -1,63 +1,101 @@
 import os
+from dataclasses import dataclass
+from functools import cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class Config:
+@dataclass(frozen=True, slots=True)
+class BotConfig:
     # Bot Configuration
-    API_ID = int(os.environ.get("API_ID", 0))
-    API_HASH = os.environ.get("API_HASH", "")
-    BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
-    
+    API_ID: int = int(os.environ.get("API_ID", 0))
+    API_HASH: str = os.environ.get("API_HASH", "")
+    BOT_TOKEN: str = os.environ.get("BOT_TOKEN", "")
+
     # MongoDB Configuration
-    MONGO_URI = os.environ.get("MONGO_URI", "")
-    DB_NAME = "TelegramDownloaderBot"
-    
+    MONGO_URI: str = os.environ.get("MONGO_URI", "")
+    DB_NAME: str = "TelegramDownloaderBot"
+
+    # MongoDB Connection Pool (shared by all database classes)
+    MONGO_POOL_MAX: int = int(os.environ.get("MONGO_POOL_MAX", 50))
+    MONGO_POOL_MIN: int = int(os.environ.get("MONGO_POOL_MIN", 5))
+    MONGO_MAX_IDLE_TIME_MS: int = 30000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 3000
+    MONGO_COMPRESSORS: str = os.environ.get("MONGO_COMPRESSORS", "zstd,zlib")
+    KNOWN_USERS_CACHE_SIZE: int = 50_000  # user ids remembered by add_user
+
     # Fixed Owners
-    OWNER_IDS = [1598576202, 6518065496]
-    
+    OWNER_IDS: frozenset = frozenset({1598576202, 6518065496})
+
     # Log Channel
-    LOG_CHANNEL = -1003286415377
-    
+    LOG_CHANNEL: int = -1003286415377
+
     # Force Subscribe Channel
-    FORCE_SUB_CHANNEL = "serenaunzipbot"
-    FORCE_SUB_LINK = "https://t.me/serenaunzipbot"
-    
+    FORCE_SUB_CHANNEL: str = "serenaunzipbot"
+    FORCE_SUB_LINK: str = "https://t.me/serenaunzipbot"
+    FORCE_SUB_CACHE_TTL: int = 300  # seconds a confirmed membership is trusted
+    FORCE_SUB_CACHE_SIZE: int = 10_000
+
     # Owner Contact
-    OWNER_CONTACT = "https://t.me/technicalserena"
-    OWNER_USERNAME = "@Xioqui_xin"
-    
+    OWNER_CONTACT: str = "https://t.me/technicalserena"
+    OWNER_USERNAME: str = "@Xioqui_xin"
+
     # Media URLs from Environment
-    START_PIC = os.environ.get("START_PIC", "")
-    THUMBNAIL_URL = os.environ.get("THUMBNAIL_URL", "")
-    
+    START_PIC: str = os.environ.get("START_PIC", "")
+    THUMBNAIL_URL: str = os.environ.get("THUMBNAIL_URL", "")
+
     # Terabox Cookies (Optional)
-    TERABOX_COOKIE = os.environ.get("TERABOX_COOKIE", "")
-    
+    TERABOX_COOKIE: str = os.environ.get("TERABOX_COOKIE", "")
+
     # Freemium Limits (Configurable)
-    FREE_DAILY_LIMIT = 5
-    FREE_MAX_SIZE = 200 * 1024 * 1024  # 200 MB
-    FREE_MAX_SIZE_MB = 200
-    
+    FREE_DAILY_LIMIT: int = 5
+    FREE_MAX_SIZE: int = 200 * 1024 * 1024  # 200 MB
+    FREE_MAX_SIZE_MB: int = 200
+    USAGE_RETENTION_DAYS: int = 7  # daily usage docs are pruned by a TTL index
+    USAGE_FLUSH_INTERVAL: float = 0.2  # seconds between batched usage writes
+    USAGE_FLUSH_MAX: int = 500  # flush early once this many users are buffered
+    USAGE_FLUSH_RETRIES: int = 8  # failed writes of one usage entry before it is dropped
+    USAGE_FLUSH_BACKOFF_MAX: float = 60.0  # longest pause between flushes while writes fail
+
     # Premium Limits
-    PREMIUM_MAX_SIZE = 4 * 1024 * 1024 * 1024  # 4 GB
-    PREMIUM_MAX_SIZE_MB = 4096
-    
+    PREMIUM_MAX_SIZE: int = 4 * 1024 * 1024 * 1024  # 4 GB
+    PREMIUM_MAX_SIZE_MB: int = 4096
+    PREMIUM_CACHE_TTL: int = 300  # seconds a premium lookup is reused
+    PREMIUM_CACHE_SIZE: int = 10_000
+    SETTINGS_CACHE_TTL: int = 60  # seconds user settings are reused between tasks
+
     # Download/Upload Settings
-    PROGRESS_UPDATE_INTERVAL = 8  # seconds
-    CHUNK_SIZE = 5 * 1024 * 1024  # 5 MB chunks
-    
-    # Message Delay (to avoid flood) - Optional
-    MESSAGE_DELAY = int(os.environ.get("MESSAGE_DELAY", 5))  # 5 seconds default
-    
+    PROGRESS_UPDATE_INTERVAL: int = 8  # seconds
+    EDIT_INTERVAL: float = 2.5  # min seconds between edits of a .txt status message
+    NET_CHUNK: int = int(os.environ.get("NET_CHUNK", 5 * 1024 * 1024))  # bytes per iter_content read (5 MB; keep >= 1 MB)
+    DISK_CHUNK: int = int(os.environ.get("DISK_CHUNK", 1024 * 1024))  # write buffer of downloaded files
+    DL_WORKERS: int = int(os.environ.get("DL_WORKERS", 4))  # concurrent downloads per .txt
+    UL_WORKERS: int = int(os.environ.get("UL_WORKERS", 2))  # concurrent Telegram uploads per .txt
+    CLEANUP_BATCH_BYTES: int = 1024 * 1024 * 1024  # uploaded files kept on disk before a sweep (1 GB)
+    LINK_CONCURRENCY: int = int(os.environ.get("LINK_CONCURRENCY", 3))  # links of one message processed at once
+    MAX_CONCURRENT_TRANSMISSIONS: int = int(os.environ.get("MAX_CONCURRENT_TRANSMISSIONS", 4))  # Pyrogram file transfers in parallel (>4 risks disconnects)
+
+    # Broadcast - max copies in flight at once
+    BROADCAST_CONCURRENCY: int = int(os.environ.get("BROADCAST_CONCURRENCY", 20))
+
     # Temp Directory
-    DOWNLOAD_DIR = "./downloads"
-    
-    # Flask Port
-    PORT = int(os.environ.get("PORT", 8080))
-    
-    # Supported Extensions
-    VIDEO_EXTENSIONS = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mpeg', '.mpg', '.ts']
-    AUDIO_EXTENSIONS = ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus']
-    IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff']
-    DOCUMENT_EXTENSIONS = ['.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.ppt', '.pptx', '.apk', '.zip', '.rar']
+    DOWNLOAD_DIR: str = "./downloads"
+
+    # Web Server Port (health checks)
+    PORT: int = int(os.environ.get("PORT", 8080))
+
+    # Supported Extensions (frozensets: only ever used for membership tests)
+    VIDEO_EXTENSIONS: frozenset = frozenset({'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mpeg', '.mpg', '.ts'})
+    AUDIO_EXTENSIONS: frozenset = frozenset({'.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus', '.amr'})
+    IMAGE_EXTENSIONS: frozenset = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.ico'})
+    ARCHIVE_EXTENSIONS: frozenset = frozenset({'.zip', '.rar', '.7z', '.tar', '.gz'})
+    DOCUMENT_EXTENSIONS: frozenset = frozenset({'.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.ppt', '.pptx', '.apk', '.zip', '.rar'})
+
+@cache
+def get_config() -> BotConfig:
+    """Get the process-wide config (environment is read once at import)"""
+    return BotConfig()
+
+# Shared config instance - `from config import Config` keeps working everywhere
+Config = get_config()
@@ -1,26 +1,56 @@
+import asyncio
 import motor.motor_asyncio
+from cachetools import LRUCache
 from config import Config
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Single Motor client shared by every Database instance
+_CLIENT = None
+_CLIENT_LOCK = asyncio.Lock()
+_INDEX_TASK = None
+
+# Users that should receive broadcasts. An equality match gives tight bounds on the
+# is_banned+user_id index, so the projected cursor is covered ($ne would scan most of it);
+# add_user always stores is_banned and _ensure_indexes backfills documents without it
+ACTIVE_USERS = {"is_banned": False}
+
+async def get_client():
+    """Get the shared MongoDB client, creating it on first use"""
+    global _CLIENT
+    async with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = motor.motor_asyncio.AsyncIOMotorClient(
+                Config.MONGO_URI,
+                maxPoolSize=Config.MONGO_POOL_MAX,
+                minPoolSize=Config.MONGO_POOL_MIN,
+                maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                compressors=Config.MONGO_COMPRESSORS,
+                retryWrites=True
+            )
+    return _CLIENT
+
 class Database:
     def __init__(self):
         self.client = None
         self.db = None
+        # Ids already known to be in the users collection (skips repeat add_user work)
+        self._known_users = LRUCache(maxsize=Config.KNOWN_USERS_CACHE_SIZE)
         
     async def connect(self):
         """Connect to MongoDB"""
+        global _INDEX_TASK
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(Config.MONGO_URI)
+            self.client = await get_client()
             self.db = self.client[Config.DB_NAME]
             
-            # Create indexes
-            await self.db.users.create_index("user_id", unique=True)
-            await self.db.premium.create_index("user_id", unique=True)
-            await self.db.settings.create_index("user_id", unique=True)
-            await self.db.daily_usage.create_index([("user_id", 1), ("date", 1)])
+            # Build indexes in the background so startup isn't blocked (once per process)
+            if _INDEX_TASK is None:
+                _INDEX_TASK = asyncio.create_task(self._ensure_indexes())
             
             logger.info("✅ Connected to MongoDB successfully!")
             return True
@@ -28,15 +58,47 @@ class Database:
             logger.error(f"❌ MongoDB connection error: {e}")
             return False
     
+    async def _ensure_indexes(self):
+        """Create all indexes concurrently (create_index is idempotent)"""
+        try:
+            await asyncio.gather(
+                self.db.users.create_index("user_id", unique=True),
+                self.db.users.create_index([("is_banned", 1), ("user_id", 1)]),
+                self.db.premium.create_index("user_id", unique=True),
+                self.db.settings.create_index("user_id", unique=True),
+                # One usage document per user per day; older string-date docs are excluded
+                self.db.daily_usage.create_index(
+                    [("user_id", 1), ("day", 1)],
+                    unique=True,
+                    partialFilterExpression={"day": {"$exists": True}}
+                ),
+                self.db.daily_usage.create_index(
+                    "created_at", expireAfterSeconds=Config.USAGE_RETENTION_DAYS * 86400
+                )
+            )
+            # ACTIVE_USERS matches is_banned: False exactly; give older documents the field
+            await self.db.users.update_many({"is_banned": {"$exists": False}}, {"$set": {"is_banned": False}})
+            logger.info("✅ MongoDB indexes ready")
+        except Exception as e:
+            logger.error(f"❌ MongoDB index creation error: {e}")
+    
     async def close(self):
-        """Close MongoDB connection"""
-        if self.client:
-            self.client.close()
+        """Close the shared MongoDB connection"""
+        global _CLIENT
+        if _CLIENT:
+            _CLIENT.close()
+            _CLIENT = None
             logger.info("MongoDB connection closed")
     
     async def add_user(self, user_id: int, username: str = None, first_name: str = None):
         """Add new user to database"""
         try:
+            if user_id in self._known_users:
+                return True
+            if await self.db.users.find_one({"user_id": user_id}, {"_id": 1}):
+                self._known_users[user_id] = True
+                return True
+            
             user_data = {
                 "user_id": user_id,
                 "username": username,
@@ -49,6 +111,7 @@ class Database:
                 {"$set": user_data},
                 upsert=True
             )
+            self._known_users[user_id] = True
             return True
         except Exception as e:
             logger.error(f"Error adding user: {e}")
@@ -70,10 +133,16 @@ class Database:
             logger.error(f"Error getting all users: {e}")
             return []
     
-    async def get_users_count(self):
+    async def iter_user_ids(self, batch_size: int = 1000):
+        """Stream ids of non-banned users (covered by the is_banned+user_id index; errors propagate)"""
+        cursor = self.db.users.find(ACTIVE_USERS, {"user_id": 1, "_id": 0}).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc["user_id"]
+    
+    async def get_users_count(self, include_banned: bool = True):
         """Get total users count"""
         try:
-            return await self.db.users.count_documents({})
+            return await self.db.users.count_documents({} if include_banned else ACTIVE_USERS)
         except Exception as e:
             logger.error(f"Error counting users: {e}")
             return 0
@@ -105,7 +174,7 @@ class Database:
     async def is_user_banned(self, user_id: int):
         """Check if user is banned"""
         try:
-            user = await self.db.users.find_one({"user_id": user_id})
+            user = await self.db.users.find_one({"user_id": user_id}, {"is_banned": 1, "_id": 0})
             return user.get("is_banned", False) if user else False
         except Exception as e:
             logger.error(f"Error checking ban status: {e}")
@@ -1,30 +1,171 @@
 from config import Config
 from datetime import datetime, timedelta
+import asyncio
 import logging
-import motor.motor_asyncio
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+from cachetools import TTLCache
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database.mongodb import Database
 
 logger = logging.getLogger(__name__)
 
-class UserDatabase:
+# Current UTC day number, recomputed only when the clock passes the next midnight
+_DAY_CACHE = {"day": None, "expires": 0.0}
+_EPOCH_ORDINAL = 719163  # date(1970, 1, 1).toordinal()
+
+def _today_key() -> int:
+    """Get today's UTC day number (same value as date.toordinal())"""
+    now = time.time()
+    if now >= _DAY_CACHE["expires"]:
+        days = int(now // 86400)
+        _DAY_CACHE["day"] = _EPOCH_ORDINAL + days
+        _DAY_CACHE["expires"] = (days + 1) * 86400.0
+    return _DAY_CACHE["day"]
+
+@dataclass(frozen=True, slots=True)
+class UserContext:
+    """Everything a task needs to know about its user, fetched once per task"""
+    user_id: int
+    is_premium: bool
+    remaining: int  # tasks left today (-1 for premium)
+    max_size: int
+    max_size_mb: int
+    settings: Mapping  # read-only view shared with the settings cache
+
+# Context of the job running in the current task (and the tasks it spawns), so
+# helpers deep in a job get cached answers without a ctx parameter
+current_user_ctx: ContextVar[Optional[UserContext]] = ContextVar("current_user_ctx", default=None)
+
+class UserDatabase(Database):
+    """Premium, usage and settings storage (shares the Motor client with Database)"""
+    
     def __init__(self):
-        self.client = None
-        self.db = None
+        super().__init__()
+        # user_id -> (is_premium, valid_until); bounded so idle users age out
+        self._premium_cache = TTLCache(maxsize=Config.PREMIUM_CACHE_SIZE, ttl=Config.PREMIUM_CACHE_TTL)
+        # Settings change only through set_setting / reset_settings, which invalidate
+        self._settings_cache = TTLCache(maxsize=Config.PREMIUM_CACHE_SIZE, ttl=Config.SETTINGS_CACHE_TTL)
+        # (user_id, day) -> pending usage count, written in bulk by _usage_flusher
+        self._usage_buf = defaultdict(int)
+        # The batch a bulk_write is sending right now; still counted by get_daily_usage
+        self._usage_inflight = {}
+        # (user_id, day) -> failed writes so far, for entries waiting to be retried
+        self._usage_attempts = {}
+        self._usage_pending = asyncio.Event()
+        self._usage_full = asyncio.Event()
+        self._usage_task = None
     
     async def connect(self):
-        """Connect to MongoDB"""
+        """Connect to MongoDB and start the usage flusher"""
+        connected = await super().connect()
+        if connected and self._usage_task is None:
+            self._usage_task = asyncio.create_task(self._usage_flusher())
+        return connected
+    
+    async def close(self):
+        """Flush buffered usage, then close the shared connection"""
+        if self._usage_task:
+            self._usage_task.cancel()
+            try:
+                await self._usage_task
+            except asyncio.CancelledError:
+                pass
+            self._usage_task = None
+        await self._flush_usage()
+        await super().close()
+    
+    async def _usage_flusher(self):
+        """Write buffered usage every USAGE_FLUSH_INTERVAL, or sooner when the buffer fills"""
+        backoff = 1.0
+        while True:
+            await self._usage_pending.wait()
+            try:
+                await asyncio.wait_for(self._usage_full.wait(), Config.USAGE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if await self._flush_usage():
+                backoff = 1.0
+            else:
+                # Mongo is failing: wait exponentially longer instead of retrying every interval
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, Config.USAGE_FLUSH_BACKOFF_MAX)
+    
+    async def _flush_usage(self) -> bool:
+        """Send all buffered usage increments in one bulk_write (False if some are left to retry)"""
+        self._usage_pending.clear()
+        self._usage_full.clear()
+        if not self._usage_buf or self.db is None:
+            return True
+        
+        batch, self._usage_buf = self._usage_buf, defaultdict(int)
+        self._usage_inflight = batch
+        keys = list(batch)
+        now = datetime.utcnow()
+        requests = [
+            UpdateOne(
+                {"user_id": user_id, "day": day},
+                {"$inc": {"count": batch[(user_id, day)]}, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+            for user_id, day in keys
+        ]
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(Config.MONGO_URI)
-            self.db = self.client[Config.DB_NAME]
-            logger.info("✅ UserDatabase connected!")
+            await self.db.daily_usage.bulk_write(requests, ordered=False)
+            self._forget_attempts(keys)
             return True
+        except BulkWriteError as e:
+            # Only the failed operations are retried, and only if retrying can help: a
+            # duplicate key is a lost upsert race, anything else (e.g. validation) won't fix itself
+            retry, dropped = [], []
+            for err in e.details.get("writeErrors", []):
+                key = keys[err["index"]]
+                if err.get("code") == 11000:
+                    retry.append(key)
+                else:
+                    dropped.append(key)
+                    logger.error(f"Dropping usage {batch[key]} for user {key[0]}: {err.get('errmsg')}")
+            logger.error(f"Error flushing usage: {len(retry) + len(dropped)} of {len(keys)} writes failed")
+            failed = set(retry)
+            self._forget_attempts([key for key in keys if key not in failed])
+            self._requeue_usage(batch, retry)
+            return not retry
+        except asyncio.CancelledError:
+            # Shutting down mid-write: keep the batch for the final flush in close()
+            self._requeue_usage(batch, keys, failed=False)
+            raise
         except Exception as e:
-            logger.error(f"❌ UserDatabase connection error: {e}")
+            logger.error(f"Error flushing usage: {e}")
+            self._requeue_usage(batch, keys)
             return False
+        finally:
+            # Written, requeued or dropped by now, so it is never counted twice
+            self._usage_inflight = {}
     
-    async def close(self):
-        """Close connection"""
-        if self.client:
-            self.client.close()
+    def _requeue_usage(self, batch, keys, failed: bool = True):
+        """Put unwritten usage back so the next flush retries it (at most USAGE_FLUSH_RETRIES times)"""
+        for key in keys:
+            if failed:
+                attempts = self._usage_attempts.get(key, 0) + 1
+                if attempts >= Config.USAGE_FLUSH_RETRIES:
+                    logger.error(f"Dropping usage {batch[key]} for user {key[0]} after {attempts} failed writes")
+                    self._usage_attempts.pop(key, None)
+                    continue
+                self._usage_attempts[key] = attempts
+            self._usage_buf[key] += batch[key]
+        if self._usage_buf:
+            self._usage_pending.set()
+    
+    def _forget_attempts(self, keys):
+        """Reset the retry count of usage entries that were written (or given up on)"""
+        if self._usage_attempts:
+            for key in keys:
+                self._usage_attempts.pop(key, None)
     
     async def add_premium(self, user_id: int, days: int):
         """Add premium to user"""
@@ -42,6 +183,7 @@ class UserDatabase:
                 {"$set": premium_data},
                 upsert=True
             )
+            self._premium_cache.pop(user_id, None)
             return True, expiry_date
         except Exception as e:
             logger.error(f"Error adding premium: {e}")
@@ -51,6 +193,7 @@ class UserDatabase:
         """Remove premium from user"""
         try:
             await self.db.premium.delete_one({"user_id": user_id})
+            self._premium_cache.pop(user_id, None)
             return True
         except Exception as e:
             logger.error(f"Error removing premium: {e}")
@@ -62,11 +205,21 @@ class UserDatabase:
             if user_id in Config.OWNER_IDS:
                 return True
             
+            now = time.monotonic()
+            cached = self._premium_cache.get(user_id)
+            if cached and cached[1] > now:
+                return cached[0]
+            
             premium = await self.db.premium.find_one({"user_id": user_id})
             if not premium:
+                self._premium_cache[user_id] = (False, now + Config.PREMIUM_CACHE_TTL)
                 return False
             
-            if premium.get("expiry_date") and premium["expiry_date"] > datetime.utcnow():
+            expiry_date = premium.get("expiry_date")
+            if expiry_date and expiry_date > datetime.utcnow():
+                # Never cache past the actual expiry
+                remaining = (expiry_date - datetime.utcnow()).total_seconds()
+                self._premium_cache[user_id] = (True, now + min(Config.PREMIUM_CACHE_TTL, remaining))
                 return True
             else:
                 await self.remove_premium(user_id)
@@ -86,25 +239,25 @@ class UserDatabase:
     async def get_daily_usage(self, user_id: int):
         """Get user's daily usage"""
         try:
-            today = datetime.utcnow().strftime("%Y-%m-%d")
+            today = _today_key()
             usage = await self.db.daily_usage.find_one({
                 "user_id": user_id,
-                "date": today
+                "day": today
             })
-            return usage.get("count", 0) if usage else 0
+            stored = usage.get("count", 0) if usage else 0
+            key = (user_id, today)
+            return stored + self._usage_buf.get(key, 0) + self._usage_inflight.get(key, 0)
         except Exception as e:
             logger.error(f"Error getting daily usage: {e}")
             return 0
     
-    async def increment_usage(self, user_id: int):
-        """Increment user's daily usage"""
+    async def increment_usage(self, user_id: int, n: int = 1):
+        """Add n to user's daily usage (buffered, written by the flusher)"""
         try:
-            today = datetime.utcnow().strftime("%Y-%m-%d")
-            await self.db.daily_usage.update_one(
-                {"user_id": user_id, "date": today},
-                {"$inc": {"count": 1}},
-                upsert=True
-            )
+            self._usage_buf[(user_id, _today_key())] += n
+            self._usage_pending.set()
+            if len(self._usage_buf) >= Config.USAGE_FLUSH_MAX:
+                self._usage_full.set()
             return True
         except Exception as e:
             logger.error(f"Error incrementing usage: {e}")
@@ -113,18 +266,37 @@ class UserDatabase:
     async def can_use_bot(self, user_id: int):
         """Check if user can use bot"""
         try:
-            if await self.is_premium(user_id):
+            is_premium, usage = await asyncio.gather(
+                self.is_premium(user_id),
+                self.get_daily_usage(user_id)
+            )
+            if is_premium:
                 return True, -1
             
-            usage = await self.get_daily_usage(user_id)
             remaining = Config.FREE_DAILY_LIMIT - usage
             return remaining > 0, remaining
         except Exception as e:
             logger.error(f"Error checking usage: {e}")
             return False, 0
     
+    async def get_user_context(self, user_id: int) -> UserContext:
+        """Get premium status, remaining quota, size limit and settings in one go"""
+        is_premium, usage, settings = await asyncio.gather(
+            self.is_premium(user_id),
+            self.get_daily_usage(user_id),
+            self.get_settings(user_id)
+        )
+        if is_premium:
+            return UserContext(user_id, True, -1, Config.PREMIUM_MAX_SIZE, Config.PREMIUM_MAX_SIZE_MB, settings)
+        return UserContext(
+            user_id, False, Config.FREE_DAILY_LIMIT - usage, Config.FREE_MAX_SIZE, Config.FREE_MAX_SIZE_MB, settings
+        )
+    
     async def get_max_size(self, user_id: int):
         """Get max file size for user"""
+        ctx = current_user_ctx.get()
+        if ctx is not None and ctx.user_id == user_id:
+            return ctx.max_size, ctx.max_size_mb
         try:
             if await self.is_premium(user_id):
                 return Config.PREMIUM_MAX_SIZE, Config.PREMIUM_MAX_SIZE_MB
@@ -133,65 +305,50 @@ class UserDatabase:
             logger.error(f"Error getting max size: {e}")
             return Config.FREE_MAX_SIZE, Config.FREE_MAX_SIZE_MB
     
-    async def get_settings(self, user_id: int):
-        """Get user settings"""
+    async def get_settings(self, user_id: int) -> Mapping:
+        """Get user settings (a read-only view: the same object is cached and shared)"""
+        ctx = current_user_ctx.get()
+        if ctx is not None and ctx.user_id == user_id:
+            return ctx.settings
         try:
+            settings = self._settings_cache.get(user_id)
+            if settings is not None:
+                return settings
+            
             settings = await self.db.settings.find_one({"user_id": user_id})
             if not settings:
-                return {
+                settings = {
                     "user_id": user_id,
                     "chat_id": None,
                     "title": None,
                     "thumbnail": None
                 }
+            settings = MappingProxyType(settings)
+            self._settings_cache[user_id] = settings
             return settings
         except Exception as e:
             logger.error(f"Error getting settings: {e}")
-            return {}
-    
-    async def set_chat_id(self, user_id: int, chat_id: int):
-        """Set custom chat ID"""
-        try:
-            await self.db.settings.update_one(
-                {"user_id": user_id},
-                {"$set": {"chat_id": chat_id, "user_id": user_id}},
-                upsert=True
-            )
-            return True
-        except Exception as e:
-            logger.error(f"Error setting chat ID: {e}")
-            return False
-    
-    async def set_title(self, user_id: int, title: str):
-        """Set custom title"""
-        try:
-            await self.db.settings.update_one(
-                {"user_id": user_id},
-                {"$set": {"title": title, "user_id": user_id}},
-                upsert=True
-            )
-            return True
-        except Exception as e:
-            logger.error(f"Error setting title: {e}")
-            return False
+            return MappingProxyType({})
     
-    async def set_thumbnail(self, user_id: int, thumbnail: str):
-        """Set custom thumbnail"""
+    async def set_setting(self, user_id: int, **fields):
+        """Set one or more settings (chat_id, title, thumbnail) in a single write"""
         try:
             await self.db.settings.update_one(
                 {"user_id": user_id},
-                {"$set": {"thumbnail": thumbnail, "user_id": user_id}},
+                {"$set": {"user_id": user_id, **fields}},
                 upsert=True
             )
+            self._settings_cache.pop(user_id, None)
             return True
         except Exception as e:
-            logger.error(f"Error setting thumbnail: {e}")
+            logger.error(f"Error updating settings {list(fields)}: {e}")
             return False
     
     async def reset_settings(self, user_id: int):
         """Reset user settings"""
         try:
             await self.db.settings.delete_one({"user_id": user_id})
+            self._settings_cache.pop(user_id, None)
             return True
         except Exception as e:
             logger.error(f"Error resetting settings: {e}")
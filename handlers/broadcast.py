@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 from datetime import datetime
 from pyrogram import Client, filters
 from pyrogram.types import Message
@@ -9,6 +10,16 @@ from database import db
 
 logger = logging.getLogger(__name__)
 
+# Live progress message, edited at most once per STATUS_EDIT_INTERVAL seconds
+STATUS_EDIT_INTERVAL = 2.0
+STATUS_TMPL = (
+    "📢 **{title}**\n\n"
+    "👥 Total Users: {t}\n"
+    "⏳ Progress: {i}/{t}\n"
+    "✅ Success: {s}\n"
+    "❌ Failed: {f}"
+)
+
 @Client.on_message(filters.command("broadcast") & filters.private)
 async def broadcast_command(client: Client, message: Message):
     """Handle /broadcast command - Owner only"""
@@ -28,74 +39,108 @@ async def broadcast_command(client: Client, message: Message):
     
     broadcast_msg = message.reply_to_message
     
-    # Get all users
-    users = await db.get_all_users()
-    total_users = len(users)
+    # Count recipients (banned users are skipped; the ids are streamed below)
+    total_users = await db.get_users_count(include_banned=False)
     
     if total_users == 0:
         return await message.reply_text("❌ No users in database!")
     
     # Status message
     status_msg = await message.reply_text(
-        f"📢 **Broadcasting Started**\n\n"
-        f"👥 Total Users: {total_users}\n"
-        f"⏳ Progress: 0/{total_users}\n"
-        f"✅ Success: 0\n"
-        f"❌ Failed: 0"
+        STATUS_TMPL.format(title="Broadcasting Started", i=0, t=total_users, s=0, f=0)
     )
     
     success = 0
     failed = 0
     blocked = 0
     deleted = 0
+    processed = 0
+    last_edit = time.monotonic()
     
     start_time = datetime.now()
     
-    for i, user in enumerate(users, 1):
+    async def send_to_user(target_id: int) -> str:
         try:
-            await broadcast_msg.copy(user["user_id"])
-            success += 1
+            await broadcast_msg.copy(target_id)
+            return "success"
         except FloodWait as e:
+            # Only sleep when Telegram actually asks us to
             await asyncio.sleep(e.value)
             try:
-                await broadcast_msg.copy(user["user_id"])
-                success += 1
-            except:
-                failed += 1
+                await broadcast_msg.copy(target_id)
+                return "success"
+            except Exception as e:
+                logger.error(f"Broadcast retry error for {target_id}: {e}")
+                return "failed"
         except UserIsBlocked:
-            blocked += 1
-            failed += 1
+            return "blocked"
         except InputUserDeactivated:
-            deleted += 1
-            failed += 1
+            return "deleted"
         except PeerIdInvalid:
-            failed += 1
+            return "failed"
         except Exception as e:
-            logger.error(f"Broadcast error for {user['user_id']}: {e}")
-            failed += 1
-        
-        # Update status every 50 users
-        if i % 50 == 0:
-            try:
-                await status_msg.edit_text(
-                    f"📢 **Broadcasting...**\n\n"
-                    f"👥 Total Users: {total_users}\n"
-                    f"⏳ Progress: {i}/{total_users}\n"
-                    f"✅ Success: {success}\n"
-                    f"❌ Failed: {failed}"
-                )
-            except:
-                pass
-        
-        # Small delay to avoid flood
-        await asyncio.sleep(0.05)
+            logger.error(f"Broadcast error for {target_id}: {e}")
+            return "failed"
+    
+    # Bounded fan-out: a fixed pool of senders fed from the user cursor
+    pending_ids = asyncio.Queue(maxsize=Config.BROADCAST_CONCURRENCY * 2)
+    
+    async def sender():
+        nonlocal success, failed, blocked, deleted, processed, last_edit
+        while True:
+            target_id = await pending_ids.get()
+            if target_id is None:
+                return
+            
+            status = await send_to_user(target_id)
+            if status == "success":
+                success += 1
+            else:
+                failed += 1
+                if status == "blocked":
+                    blocked += 1
+                elif status == "deleted":
+                    deleted += 1
+            processed += 1
+            
+            # Update status on wall-clock time, not per N users
+            now = time.monotonic()
+            if now - last_edit > STATUS_EDIT_INTERVAL:
+                last_edit = now  # claim the slot before awaiting so other senders skip
+                try:
+                    await status_msg.edit_text(
+                        STATUS_TMPL.format(
+                            title="Broadcasting...", i=processed, t=total_users, s=success, f=failed
+                        )
+                    )
+                except Exception:
+                    pass
+    
+    stopped_early = False
+    senders = [asyncio.create_task(sender()) for _ in range(Config.BROADCAST_CONCURRENCY)]
+    try:
+        try:
+            async for target_id in db.iter_user_ids():
+                await pending_ids.put(target_id)
+        except Exception as e:
+            # The user cursor died: send to the users already queued, then report a partial run
+            logger.error(f"Broadcast user stream failed: {e}")
+            stopped_early = True
+        for _ in senders:
+            await pending_ids.put(None)
+        await asyncio.gather(*senders)
+    finally:
+        # Cancelled mid-broadcast: don't leave senders running on their own
+        for task in senders:
+            task.cancel()
     
     end_time = datetime.now()
     time_taken = (end_time - start_time).seconds
+    title = "Broadcast Stopped Early" if stopped_early else "Broadcast Completed"
     
     # Final status
     await status_msg.edit_text(
-        f"📢 **Broadcast Completed!**\n\n"
+        f"📢 **{title}!**\n\n"
         f"━━━━━━━━━━━━━━━━━━━━━━\n"
         f"👥 **Total Users:** {total_users}\n"
         f"✅ **Success:** {success}\n"
@@ -104,18 +149,19 @@ async def broadcast_command(client: Client, message: Message):
         f"👻 **Deleted:** {deleted}\n"
         f"⏱️ **Time Taken:** {time_taken}s\n"
         f"━━━━━━━━━━━━━━━━━━━━━━"
+        + ("\n\n⚠️ Couldn't read the rest of the user list; see the logs." if stopped_early else "")
     )
     
     # Log to channel
     try:
         await client.send_message(
             Config.LOG_CHANNEL,
-            f"📢 **Broadcast Completed**\n\n"
+            f"📢 **{title}**\n\n"
             f"👤 **By:** {message.from_user.mention} (`{user_id}`)\n"
             f"👥 **Total:** {total_users}\n"
             f"✅ **Success:** {success}\n"
             f"❌ **Failed:** {failed}\n"
             f"⏱️ **Time:** {time_taken}s"
         )
-    except:
+    except Exception:
         pass
@@ -2,72 +2,98 @@ import os
 import uuid
 import asyncio
 import logging
+from dataclasses import dataclass
+from typing import Optional
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
 from database import db, user_db
-from utils.downloader import Downloader
-from utils.uploader import Uploader
+from database.users import UserContext, current_user_ctx
+from utils.registry import downloader, uploader
+from utils.progress import ThrottledEditor
+from utils.queue_manager import queue_manager
 from utils.helpers import (
-    read_txt_file, create_download_dir, cleanup_file, cleanup_user_dir,
-    is_gdrive_link, is_terabox_link, is_direct_link,
-    get_file_extension, get_file_type, get_readable_file_size, generate_summary
+    classify_txt_bytes, create_download_dir, cleanup_file, cleanup_dirs,
+    classify_link, check_force_sub, get_bot_info, is_bot_mentioned,
+    get_file_extension, get_file_type, get_readable_file_size, generate_summary, JobResults
 )
 
 logger = logging.getLogger(__name__)
 
-downloader = Downloader()
-uploader = Uploader()
+# Replies that never change, built once at import
+PREMIUM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("👨‍💻 Get Premium", url=Config.OWNER_CONTACT)]
+])
+FORCE_SUB_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Join Channel", url=Config.FORCE_SUB_LINK)],
+])
+FORCE_SUB_TEXT = "⚠️ **Please join our channel first!**"
+DAILY_LIMIT_TEXT = (
+    "❌ **Daily Limit Reached!**\n\n"
+    f"You've used all {Config.FREE_DAILY_LIMIT} free tasks for today.\n\n"
+    "💎 Upgrade to Premium for unlimited access!"
+)
+BANNED_TEXT = "❌ You are banned from using this bot!"
+QUEUED_TEXT = "⏳ **Queued!**\n\nYour previous .txt is still running. This one starts right after."
+READING_TEXT = "📄 **Processing .txt file...**\n\n⏳ Reading links..."
+NO_LINKS_TEXT = (
+    "❌ **No Links Found!**\n\n"
+    "The .txt file doesn't contain any valid links."
+)
+NO_SUPPORTED_TMPL = (
+    "❌ **No Supported Links Found!**\n\n"
+    "Total links: {total}\n"
+    "Unsupported: {unsupported}"
+)
+PARSED_TMPL = (
+    "📄 **TXT File Processed!**\n\n"
+    "✅ **Supported:** {supported}\n"
+    "❌ **Unsupported:** {unsupported}\n\n"
+    "⏳ Starting downloads..."
+)
+PROGRESS_TMPL = (
+    "📥 **Processed {done}/{total}**\n\n"
+    "✅ Success: {success}\n"
+    "❌ Failed: {failed}"
+)
+LIMIT_EXCEEDED_TMPL = (
+    "❌ **Limit Exceeded!**\n\n"
+    "Links in file: {links}\n"
+    "Remaining today: {remaining}\n\n"
+    "💎 Upgrade to Premium for unlimited access!"
+)
 
 
-async def check_force_sub(client: Client, user_id: int) -> bool:
-    """Check if user has joined force subscribe channel"""
-    try:
-        member = await client.get_chat_member(Config.FORCE_SUB_CHANNEL, user_id)
-        if member.status in ["kicked", "banned", "left"]:
-            return False
-        return True
-    except Exception:
-        return True
+@dataclass(slots=True)
+class LinkResult:
+    """Outcome of one .txt link"""
+    success: bool
+    file_type: Optional[str] = None
 
 
-@Client.on_message(filters.private & filters.document)
+def is_txt_document(message: Message) -> bool:
+    """Check for a .txt document before doing any other work"""
+    document = message.document
+    return bool(document and document.file_name and document.file_name[-4:].lower() == '.txt')
+
+
+# Dispatch-level guard: other documents never reach (or block) these handlers
+txt_filter = filters.create(lambda _, __, message: is_txt_document(message))
+
+
+@Client.on_message(filters.private & filters.document & txt_filter)
 async def private_document_handler(client: Client, message: Message):
     """Handle document uploads in private chat"""
-    
-    if not message.document:
-        return
-    
-    if not message.document.file_name:
-        return
-    
-    if not message.document.file_name.lower().endswith('.txt'):
-        return
-    
-    logger.info(f"📄 TXT file received from {message.from_user.id}")
+    logger.info("📄 TXT file received from %s", message.from_user.id)
     
     await process_txt_file(client, message, is_group=False)
 
 
-@Client.on_message(filters.group & filters.document)
+@Client.on_message(filters.group & filters.document & txt_filter)
 async def group_document_handler(client: Client, message: Message):
     """Handle document uploads in groups"""
-    
-    if not message.document:
-        return
-    
-    if not message.document.file_name:
-        return
-    
-    if not message.document.file_name.lower().endswith('.txt'):
-        return
-    
-    bot = await client.get_me()
-    bot_username = f"@{bot.username}".lower() if bot.username else ""
-    
-    is_mentioned = False
-    if message.caption and bot_username:
-        is_mentioned = bot_username in message.caption.lower()
+    bot = await get_bot_info(client)
+    is_mentioned = is_bot_mentioned(message.caption)
     
     is_reply_to_bot = False
     if message.reply_to_message and message.reply_to_message.from_user:
@@ -76,257 +102,363 @@ async def group_document_handler(client: Client, message: Message):
     if not (is_mentioned or is_reply_to_bot):
         return
     
-    logger.info(f"📄 TXT file received in group from {message.from_user.id}")
+    logger.info("📄 TXT file received in group from %s", message.from_user.id)
     
     await process_txt_file(client, message, is_group=True)
 
 
+async def admit_user(client: Client, message: Message, is_group: bool) -> bool:
+    """Register the user and run the ban / force-sub checks in one concurrent round;
+    replies and returns False when the user may not start a job"""
+    user = message.from_user
+    checks = [
+        db.add_user(user.id, user.username, user.first_name or "User"),
+        db.is_user_banned(user.id),
+    ]
+    if not is_group:
+        checks.append(check_force_sub(client, user.id))
+    # The db helpers and check_force_sub log their own errors and fail open
+    results = await asyncio.gather(*checks, return_exceptions=True)
+    
+    if results[1] is True:
+        await message.reply_text(BANNED_TEXT)
+        return False
+    if not is_group and results[2] is False:
+        await message.reply_text(FORCE_SUB_TEXT, reply_markup=FORCE_SUB_KB)
+        return False
+    return True
+
+
 async def process_txt_file(client: Client, message: Message, is_group: bool = False):
     """Process txt file with links"""
     user_id = message.from_user.id
     username = message.from_user.username
-    first_name = message.from_user.first_name or "User"
     chat_id = message.chat.id
     
-    try:
-        await db.add_user(user_id, username, first_name)
-    except Exception as e:
-        logger.error(f"DB error: {e}")
+    if not await admit_user(client, message, is_group):
+        return
     
-    try:
-        if await db.is_user_banned(user_id):
-            return await message.reply_text("❌ You are banned from using this bot!")
-    except:
-        pass
+    # One job per user at a time: a second .txt waits for the first, so quota checks
+    # see the first job's usage and its final cleanup can't delete the second's files
+    lock = queue_manager.locks[user_id]
+    if lock.locked():
+        await message.reply_text(QUEUED_TEXT, reply_to_message_id=message.id)
     
-    if not is_group:
+    async with lock:
+        queue_manager.set_processing(user_id, True)
+        # Handlers run on long-lived dispatcher workers: undo the job's context afterwards
+        token = current_user_ctx.set(None)
         try:
-            if not await check_force_sub(client, user_id):
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📢 Join Channel", url=Config.FORCE_SUB_LINK)],
-                ])
-                return await message.reply_text(
-                    "⚠️ **Please join our channel first!**",
-                    reply_markup=keyboard
-                )
-        except:
-            pass
+            await run_txt_job(client, message, is_group, user_id, username, chat_id)
+        finally:
+            current_user_ctx.reset(token)
+            queue_manager.set_processing(user_id, False)
+
+
+async def run_txt_job(
+    client: Client,
+    message: Message,
+    is_group: bool,
+    user_id: int,
+    username: str,
+    chat_id: int
+):
+    """Check quota, then download and upload every link in the .txt"""
+    # One lookup for quota, size limit and settings, shared by every link below
+    ctx = await user_db.get_user_context(user_id)
+    current_user_ctx.set(ctx)
+    is_premium = ctx.is_premium
+    remaining = ctx.remaining
     
-    try:
-        can_use, remaining = await user_db.can_use_bot(user_id)
-        is_premium = await user_db.is_premium(user_id)
-        
-        if not can_use:
-            return await message.reply_text(
-                "❌ **Daily Limit Reached!**\n\n"
-                f"You've used all {Config.FREE_DAILY_LIMIT} free tasks for today.\n\n"
-                "💎 Upgrade to Premium for unlimited access!",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("👨‍💻 Get Premium", url=Config.OWNER_CONTACT)]
-                ])
-            )
-    except:
-        is_premium = False
-        remaining = Config.FREE_DAILY_LIMIT
+    if not is_premium and remaining <= 0:
+        return await message.reply_text(DAILY_LIMIT_TEXT, reply_markup=PREMIUM_KB)
     
-    status_msg = await message.reply_text(
-        "📄 **Processing .txt file...**\n\n⏳ Reading links...",
-        reply_to_message_id=message.id
-    )
+    status_msg = await message.reply_text(READING_TEXT, reply_to_message_id=message.id)
     
     if is_group:
         try:
             await status_msg.pin(disable_notification=True)
-        except:
+        except Exception:
             pass
     
-    download_path = create_download_dir(user_id)
-    txt_file_path = os.path.join(download_path, message.document.file_name)
-    
+    # The .txt is small: read it in memory instead of writing it to disk first
     try:
-        await message.download(txt_file_path)
-        logger.info(f"📥 Downloaded txt file: {txt_file_path}")
+        txt_file = await message.download(in_memory=True)
+        logger.info("📥 Downloaded txt file: %s", message.document.file_name)
     except Exception as e:
-        await cleanup_file(txt_file_path)
         return await status_msg.edit_text(f"❌ Failed to download file: {e}")
     
-    links = await read_txt_file(txt_file_path)
-    await cleanup_file(txt_file_path)
+    # Large scraper dumps take a while to parse; decode, dedupe and classify in one
+    # pass on a worker thread so the event loop stays free
+    supported_links, total_links = await asyncio.to_thread(classify_txt_bytes, txt_file.getbuffer())
+    unsupported_count = total_links - len(supported_links)
     
-    if not links:
-        return await status_msg.edit_text(
-            "❌ **No Links Found!**\n\n"
-            "The .txt file doesn't contain any valid links."
-        )
+    if not total_links:
+        return await status_msg.edit_text(NO_LINKS_TEXT)
     
-    logger.info(f"📎 Found {len(links)} links in txt file")
-    
-    supported_links = []
-    unsupported_count = 0
-    
-    for link in links:
-        if is_gdrive_link(link) or is_terabox_link(link) or is_direct_link(link):
-            supported_links.append(link)
-        else:
-            unsupported_count += 1
+    logger.info("📎 Found %d links in txt file", total_links)
     
     if not supported_links:
         return await status_msg.edit_text(
-            f"❌ **No Supported Links Found!**\n\n"
-            f"Total links: {len(links)}\n"
-            f"Unsupported: {unsupported_count}"
+            NO_SUPPORTED_TMPL.format(total=total_links, unsupported=unsupported_count)
         )
     
+    total = len(supported_links)
     if not is_premium:
-        if len(supported_links) > remaining:
+        if total > remaining:
             return await status_msg.edit_text(
-                f"❌ **Limit Exceeded!**\n\n"
-                f"Links in file: {len(supported_links)}\n"
-                f"Remaining today: {remaining}\n\n"
-                f"💎 Upgrade to Premium for unlimited access!",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("👨‍💻 Get Premium", url=Config.OWNER_CONTACT)]
-                ])
+                LIMIT_EXCEEDED_TMPL.format(links=total, remaining=remaining),
+                reply_markup=PREMIUM_KB
             )
     
-    await status_msg.edit_text(
-        f"📄 **TXT File Processed!**\n\n"
-        f"✅ **Supported:** {len(supported_links)}\n"
-        f"❌ **Unsupported:** {unsupported_count}\n\n"
-        f"⏳ Starting downloads..."
-    )
-    
-    results = {
-        'total': len(supported_links),
-        'success': 0,
-        'failed': 0,
-        'file_types': {}
-    }
-    
-    for i, link in enumerate(supported_links, 1):
-        try:
-            await status_msg.edit_text(
-                f"📥 **Processing {i}/{len(supported_links)}**\n\n"
-                f"🔗 `{link[:50]}...`\n"
-                f"⏳ Downloading..."
-            )
-            
-            success, file_type = await download_and_upload(
-                client=client,
-                url=link,
-                user_id=user_id,
-                username=username,
-                chat_id=chat_id,
-                reply_to_id=message.id,
-                progress_message=status_msg
-            )
-            
-            if success:
-                results['success'] += 1
-                if file_type:
-                    results['file_types'][file_type] = results['file_types'].get(file_type, 0) + 1
-                
-                if not is_premium:
-                    try:
-                        await user_db.increment_usage(user_id)
-                    except:
-                        pass
-            else:
-                results['failed'] += 1
+    await status_msg.edit_text(PARSED_TMPL.format(supported=total, unsupported=unsupported_count))
+    
+    results = JobResults(total=total)
+    done = 0
+    
+    # Everything this job downloads lives under its own folder, removed as a whole at the end
+    # (created below, next to the workers that fill it)
+    job_dir = None
+    
+    # Workers and downloader/uploader progress all share one throttled status message
+    status = ThrottledEditor(status_msg)
+    
+    async def record(result: LinkResult):
+        nonlocal done
+        done += 1
+        results.record(result.success, result.file_type)
         
-        except Exception as e:
-            logger.error(f"Error processing link: {e}")
-            results['failed'] += 1
+        await status.edit_text(
+            PROGRESS_TMPL.format(done=done, total=total, success=results.success, failed=results.failed)
+        )
     
-    await cleanup_user_dir(user_id)
+    # A rate-limited batch can fail the same way dozens of times; log each kind once
+    failure_kinds = set()
+    
+    def log_failure(stage: str, e: Exception):
+        kind = (stage, type(e).__name__)
+        if kind not in failure_kinds:
+            failure_kinds.add(kind)
+            logger.error("Error %s link (%s, further ones not logged): %s", stage, type(e).__name__, e)
+    
+    # Log channel entries go out in one batch when the job ends
+    log_entries = []
+    
+    # Two stages: downloads feed uploads, so link N+1 downloads while link N uploads.
+    # upload_q is bounded so finished downloads can't pile up on disk.
+    download_q = asyncio.Queue()
+    upload_q = asyncio.Queue(maxsize=Config.UL_WORKERS)
+    for link_kind in supported_links:
+        download_q.put_nowait(link_kind)
+    
+    async def download_worker():
+        while not download_q.empty():
+            link, kind = download_q.get_nowait()
+            try:
+                item = await download_link(client, link, user_id, username, status, kind, ctx, log_entries, job_dir)
+            except Exception as e:
+                log_failure("downloading", e)
+                item = None
+            if item:
+                await upload_q.put(item)
+            else:
+                await record(LinkResult(False))
+    
+    # Uploaded folders are removed in batches once enough bytes pile up
+    cleanup_batch_bytes = Config.CLEANUP_BATCH_BYTES
+    finished_dirs = []
+    finished_bytes = 0
+    
+    async def upload_worker():
+        nonlocal finished_dirs, finished_bytes
+        while True:
+            item = await upload_q.get()
+            if item is None:
+                return
+            try:
+                result = LinkResult(*await upload_downloaded(
+                    client, item, user_id, username, chat_id, message.id, status, ctx,
+                    keep_on_success=True, log_entries=log_entries
+                ))
+            except Exception as e:
+                log_failure("uploading", e)
+                result = LinkResult(False)
+            
+            if result.success:
+                finished_dirs.append(item["download_path"])
+                finished_bytes += item["file_size"]
+                if finished_bytes >= cleanup_batch_bytes:
+                    batch, finished_dirs, finished_bytes = finished_dirs, [], 0
+                    await cleanup_dirs(batch)
+            await record(result)
     
-    summary = generate_summary(results)
     try:
-        await status_msg.edit_text(summary)
-    except:
-        pass
-    
-    if is_group:
+        job_dir = await create_download_dir(user_id, uuid.uuid4().hex)
+        
+        # Structured concurrency: if the job is cancelled, every worker goes with it
+        async with asyncio.TaskGroup() as tg:
+            uploaders = [tg.create_task(upload_worker()) for _ in range(Config.UL_WORKERS)]
+            downloaders = [tg.create_task(download_worker()) for _ in range(Config.DL_WORKERS)]
+            await asyncio.wait(downloaders)
+            for _ in uploaders:
+                await upload_q.put(None)
+    finally:
+        # Runs even if a worker fails or the job is cancelled, so what was uploaded is still
+        # charged (in one update) and the status message still gets its summary and unpin
+        if not is_premium and results.success:
+            try:
+                await user_db.increment_usage(user_id, results.success)
+            except Exception:
+                pass
+        
+        # Takes any finished downloads still queued for upload with it
+        await cleanup_file(job_dir)
+        
+        # Entries for files that were delivered before a failure still reach the log channel
+        try:
+            await uploader.send_log_batch(client, user_id, username, log_entries)
+        except Exception:
+            pass
+        
+        # Replaces any progress text still queued, so nothing lands after the summary
         try:
-            await status_msg.unpin()
-        except:
+            await status.flush(generate_summary(results))
+        except Exception:
             pass
+        
+        if is_group:
+            try:
+                await status_msg.unpin()
+            except Exception:
+                pass
 
 
-async def download_and_upload(
+async def download_link(
     client: Client,
     url: str,
     user_id: int,
     username: str,
-    chat_id: int,
-    reply_to_id: int,
-    progress_message: Message
-) -> tuple:
-    """Download and upload a single link"""
-    download_path = create_download_dir(user_id)
-    file_path = None
+    progress_message: Message,
+    kind: str = None,
+    ctx: UserContext = None,
+    log_entries: list = None,
+    job_dir: str = None
+):
+    """Download a single link into its own folder (inside job_dir, if given); returns the
+    item to upload or None (log channel entries are appended to log_entries instead of sent, when given)"""
+    download_path = await create_download_dir(user_id, uuid.uuid4().hex[:12], job_dir)
+    download = downloader.download_by_kind.get(kind or classify_link(url), downloader.download_direct)
     
     try:
-        if is_gdrive_link(url):
-            success, file_path, error = await downloader.download_gdrive(url, download_path, progress_message)
-        elif is_terabox_link(url):
-            success, file_path, error = await downloader.download_terabox(url, download_path, progress_message)
-        else:
-            success, file_path, error = await downloader.download_direct(url, download_path, progress_message)
+        success, file_path, error = await download(url, download_path, progress_message)
         
         if not success or not file_path:
             await progress_message.edit_text(f"❌ **Download Failed!**\n\n`{error}`")
-            await uploader.send_log(client, user_id, username, url, "Unknown", "failed", error)
-            return False, None
+            if log_entries is None:
+                await uploader.send_log(client, user_id, username, url, "Unknown", "failed", error)
+            else:
+                log_entries.append((url, "Unknown", "failed", error))
+            await cleanup_file(download_path)
+            return None
         
         filename = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        extension = get_file_extension(filename)
-        file_type = get_file_type(extension)
+        file_size = await asyncio.to_thread(os.path.getsize, file_path)
         
-        max_size, max_size_mb = await user_db.get_max_size(user_id)
-        if file_size > max_size:
-            await cleanup_file(file_path)
-            error_msg = f"File too large! Max: {max_size_mb}MB"
+        ctx = ctx or await user_db.get_user_context(user_id)
+        if file_size > ctx.max_size:
+            await cleanup_file(download_path)
+            error_msg = f"File too large! Max: {ctx.max_size_mb}MB"
             await progress_message.edit_text(f"❌ {error_msg}")
-            return False, None
+            return None
         
-        try:
-            settings = await user_db.get_settings(user_id)
-            custom_thumbnail = settings.get("thumbnail")
-            target_chat = settings.get("chat_id") or chat_id
-        except:
-            custom_thumbnail = None
-            target_chat = chat_id
+        return {
+            "url": url,
+            "file_path": file_path,
+            "download_path": download_path,
+            "filename": filename,
+            "file_size": file_size,
+            "file_type": get_file_type(get_file_extension(filename))
+        }
+    
+    except Exception as e:
+        logger.error("Download error: %s", e)
+        await cleanup_file(download_path)
+        return None
+
+
+async def upload_downloaded(
+    client: Client,
+    item: dict,
+    user_id: int,
+    username: str,
+    chat_id: int,
+    reply_to_id: int,
+    progress_message: Message,
+    ctx: UserContext = None,
+    keep_on_success: bool = False,
+    log_entries: list = None
+) -> tuple:
+    """Upload a file produced by download_link, then remove its folder
+    (after a successful upload the folder is left to the caller if keep_on_success)"""
+    filename = item["filename"]
+    uploaded = False
+    
+    try:
+        settings = ctx.settings if ctx else await user_db.get_settings(user_id)
+        custom_thumbnail = settings.get("thumbnail")
+        target_chat = settings.get("chat_id") or chat_id
         
-        caption = f"📁 **{filename}**\n📊 Size: {get_readable_file_size(file_size)}"
+        caption = f"📁 **{filename}**\n📊 Size: {get_readable_file_size(item['file_size'])}"
         
         success, sent_msg, error = await uploader.upload_file(
             client=client,
-            file_path=file_path,
+            file_path=item["file_path"],
             chat_id=target_chat,
             progress_message=progress_message,
             caption=caption,
             reply_to_message_id=reply_to_id if target_chat == chat_id else None,
             message_thread_id=None,
             custom_thumbnail=custom_thumbnail,
-            file_type=file_type
+            file_type=item["file_type"],
+            file_size=item["file_size"]
         )
         
-        await cleanup_file(file_path)
-        
         if success:
+            uploaded = True
             await progress_message.edit_text(f"✅ **Uploaded!**\n\n📁 `{filename}`")
-            await uploader.send_log(client, user_id, username, url, filename, "success")
-            return True, file_type
+            if log_entries is None:
+                await uploader.send_log(client, user_id, username, item["url"], filename, "success")
+            else:
+                log_entries.append((item["url"], filename, "success", None))
+            return True, item["file_type"]
         else:
             await progress_message.edit_text(f"❌ **Upload Failed!**\n\n`{error}`")
             return False, None
     
     except Exception as e:
-        if file_path:
-            await cleanup_file(file_path)
+        logger.error("Upload error: %s", e)
+        return False, None
+    
+    finally:
+        # Failures free their disk space right away; batch callers sweep successes later
+        if not (uploaded and keep_on_success):
+            await cleanup_file(item["download_path"])
+
+
+async def download_and_upload(
+    client: Client,
+    url: str,
+    user_id: int,
+    username: str,
+    chat_id: int,
+    reply_to_id: int,
+    progress_message: Message
+) -> tuple:
+    """Download and upload a single link"""
+    item = await download_link(client, url, user_id, username, progress_message)
+    if not item:
         return False, None
+    return await upload_downloaded(client, item, user_id, username, chat_id, reply_to_id, progress_message)
 
 
 logger.info("✅ File handler loaded successfully!")
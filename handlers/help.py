@@ -111,41 +111,7 @@ Auto-generated for:
     premium_size=Config.PREMIUM_MAX_SIZE_MB
 )
 
-@Client.on_message(filters.command("help"))
-async def help_command(client: Client, message: Message):
-    """Handle /help command"""
-    user_id = message.from_user.id
-    is_premium = await user_db.is_premium(user_id)
-    
-    status = "💎 Premium User" if is_premium else "🆓 Freemium User"
-    
-    keyboard = InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton("📥 How to Download", callback_data="help_download"),
-            InlineKeyboardButton("📝 Bulk Download", callback_data="help_bulk")
-        ],
-        [
-            InlineKeyboardButton("👥 Group Usage", callback_data="help_group"),
-            InlineKeyboardButton("💎 Premium", callback_data="help_premium")
-        ],
-        [
-            InlineKeyboardButton("📢 Channel", url=Config.FORCE_SUB_LINK),
-            InlineKeyboardButton("👨‍💻 Support", url=Config.OWNER_CONTACT)
-        ],
-        [InlineKeyboardButton("❌ Close", callback_data="close")]
-    ])
-    
-    await message.reply_text(
-        f"📚 **Bot Help & Guide**\n\n"
-        f"👤 Your Status: {status}\n\n"
-        f"Select a topic below or read the full guide:",
-        reply_markup=keyboard
-    )
-
-@Client.on_callback_query(filters.regex("^help_download$"))
-async def help_download_callback(client: Client, callback_query: CallbackQuery):
-    """Download help callback"""
-    text = """
+HELP_DOWNLOAD_TEXT = """
 📥 **HOW TO DOWNLOAD**
 
 **Step 1:** Get your download link
@@ -172,17 +138,8 @@ File uploaded with:
   https://drive.google.com/file/d/1ABC.../view
 
   """
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
-    ])
-    
-    await callback_query.message.edit_text(text, reply_markup=keyboard)
-    await callback_query.answer()
 
-@Client.on_callback_query(filters.regex("^help_bulk$"))
-async def help_bulk_callback(client: Client, callback_query: CallbackQuery):
-    """Bulk download help callback"""
-    text = """
+HELP_BULK_TEXT = """
 📝 **BULK DOWNLOAD (.txt)**
 
 **Step 1:** Create a text file
@@ -214,17 +171,8 @@ After completion:
 • Failed count
 • File types breakdown
 """
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
-    ])
-    
-    await callback_query.message.edit_text(text, reply_markup=keyboard)
-    await callback_query.answer()
 
-@Client.on_callback_query(filters.regex("^help_group$"))
-async def help_group_callback(client: Client, callback_query: CallbackQuery):
-    """Group help callback"""
-    text = """
+HELP_GROUP_TEXT = """
 👥 **GROUP USAGE**
 
 **Method 1: Reply**
@@ -248,17 +196,9 @@ Reply to bot's message with link
 • Queue shared with DM
 • Progress shown in group
 """
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
-    ])
-    
-    await callback_query.message.edit_text(text, reply_markup=keyboard)
-    await callback_query.answer()
 
-@Client.on_callback_query(filters.regex("^help_premium$"))
-async def help_premium_callback(client: Client, callback_query: CallbackQuery):
-    """Premium help callback"""
-    text = f"""
+# Only depends on Config constants, so it is formatted once here
+HELP_PREMIUM_TEXT = f"""
 💎 **PREMIUM BENEFITS**
 
 **🆓 FREEMIUM:**
@@ -283,12 +223,71 @@ async def help_premium_callback(client: Client, callback_query: CallbackQuery):
 **Get Premium:**
 Contact owner for premium subscription!
 """
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("👨‍💻 Get Premium", url=Config.OWNER_CONTACT)],
-        [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
-    ])
+
+HELP_MAIN_TMPL = (
+    "📚 **Bot Help & Guide**\n\n"
+    "👤 Your Status: {status}\n\n"
+    "Select a topic below or read the full guide:"
+)
+
+# Keyboards never change, so they are built once at import
+HELP_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📥 How to Download", callback_data="help_download"),
+        InlineKeyboardButton("📝 Bulk Download", callback_data="help_bulk")
+    ],
+    [
+        InlineKeyboardButton("👥 Group Usage", callback_data="help_group"),
+        InlineKeyboardButton("💎 Premium", callback_data="help_premium")
+    ],
+    [
+        InlineKeyboardButton("📢 Channel", url=Config.FORCE_SUB_LINK),
+        InlineKeyboardButton("👨‍💻 Support", url=Config.OWNER_CONTACT)
+    ],
+    [InlineKeyboardButton("❌ Close", callback_data="close")]
+])
+
+BACK_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
+])
+
+PREMIUM_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("👨‍💻 Get Premium", url=Config.OWNER_CONTACT)],
+    [InlineKeyboardButton("◀️ Back", callback_data="help_main")]
+])
+
+@Client.on_message(filters.command("help"))
+async def help_command(client: Client, message: Message):
+    """Handle /help command"""
+    user_id = message.from_user.id
+    is_premium = await user_db.is_premium(user_id)
     
-    await callback_query.message.edit_text(text, reply_markup=keyboard)
+    status = "💎 Premium User" if is_premium else "🆓 Freemium User"
+    
+    await message.reply_text(HELP_MAIN_TMPL.format(status=status), reply_markup=HELP_KEYBOARD)
+
+@Client.on_callback_query(filters.regex("^help_download$"))
+async def help_download_callback(client: Client, callback_query: CallbackQuery):
+    """Download help callback"""
+    await callback_query.message.edit_text(HELP_DOWNLOAD_TEXT, reply_markup=BACK_KEYBOARD)
+    await callback_query.answer()
+
+@Client.on_callback_query(filters.regex("^help_bulk$"))
+async def help_bulk_callback(client: Client, callback_query: CallbackQuery):
+    """Bulk download help callback"""
+    await callback_query.message.edit_text(HELP_BULK_TEXT, reply_markup=BACK_KEYBOARD)
+    await callback_query.answer()
+
+@Client.on_callback_query(filters.regex("^help_group$"))
+async def help_group_callback(client: Client, callback_query: CallbackQuery):
+    """Group help callback"""
+    await callback_query.message.edit_text(HELP_GROUP_TEXT, reply_markup=BACK_KEYBOARD)
+    await callback_query.answer()
+
+@Client.on_callback_query(filters.regex("^help_premium$"))
+async def help_premium_callback(client: Client, callback_query: CallbackQuery):
+    """Premium help callback"""
+    await callback_query.message.edit_text(HELP_PREMIUM_TEXT, reply_markup=PREMIUM_KEYBOARD)
     await callback_query.answer()
 
 @Client.on_callback_query(filters.regex("^help_main$"))
@@ -298,26 +297,5 @@ async def help_main_callback(client: Client, callback_query: CallbackQuery):
     is_premium = await user_db.is_premium(user_id)
     status = "💎 Premium User" if is_premium else "🆓 Freemium User"
     
-    keyboard = InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton("📥 How to Download", callback_data="help_download"),
-            InlineKeyboardButton("📝 Bulk Download", callback_data="help_bulk")
-        ],
-        [
-            InlineKeyboardButton("👥 Group Usage", callback_data="help_group"),
-            InlineKeyboardButton("💎 Premium", callback_data="help_premium")
-        ],
-        [
-            InlineKeyboardButton("📢 Channel", url=Config.FORCE_SUB_LINK),
-            InlineKeyboardButton("👨‍💻 Support", url=Config.OWNER_CONTACT)
-        ],
-        [InlineKeyboardButton("❌ Close", callback_data="close")]
-    ])
-    
-    await callback_query.message.edit_text(
-        f"📚 **Bot Help & Guide**\n\n"
-        f"👤 Your Status: {status}\n\n"
-        f"Select a topic below or read the full guide:",
-        reply_markup=keyboard
-    )
+    await callback_query.message.edit_text(HELP_MAIN_TMPL.format(status=status), reply_markup=HELP_KEYBOARD)
     await callback_query.answer()
@@ -1,35 +1,311 @@
-# In download_and_upload_link function, replace the download logic:
+import os
+import re
+import uuid
+import asyncio
+import logging
+import contextlib
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from config import Config
+from database import user_db
+from database.users import UserContext, current_user_ctx
+from utils.registry import downloader, uploader
+from utils.progress import ThrottledEditor
+from utils.queue_manager import queue_manager
+from utils.helpers import (
+    iter_links, link_key, classify_link, is_terabox_folder,
+    get_bot_info, is_bot_mentioned, create_download_dir, cleanup_file,
+    get_file_extension, get_file_type, generate_summary, JobResults
+)
+from handlers.file_handler import (
+    admit_user, download_link, upload_downloaded,
+    PREMIUM_KB, DAILY_LIMIT_TEXT, LIMIT_EXCEEDED_TMPL
+)
+from handlers.settings import setting_states
 
-async def download_and_upload_link(
+logger = logging.getLogger(__name__)
+
+# Anything that looks like a link; compiled once, one scan per message, no lowercased copy
+_LINK_RE = re.compile(r'https?://|drive\.google\.com|terabox|1024tera|storage\.googleapis', re.IGNORECASE)
+
+# Replies that never change, built once at import
+LINK_QUEUED_TEXT = "⏳ **Queued!**\n\nYour previous task is still running. These links start right after."
+NO_SUPPORTED_LINKS_TEXT = "❌ **No supported links found!**\n\nSend a Google Drive, Terabox or direct download link."
+STARTING_TMPL = "🔍 **Found {total} link(s)**\n\n⏳ Starting downloads..."
+LINK_TMPL = "⏳ **Link {index}/{total}**\n\n`{link}`"
+FOLDER_TMPL = "📁 **Terabox Folder**\n\nFound {count} file(s)\n⏳ Starting downloads..."
+FOLDER_LIMITED_TMPL = (
+    "📁 **Terabox Folder**\n\nFound {found} file(s), your daily limit covers {count}\n"
+    "⏳ Starting downloads..."
+)
+FOLDER_FILE_TMPL = "📁 **Folder file {index}/{count}**\n\n`{filename}`"
+FOLDER_EMPTY_TEXT = (
+    "❌ **Couldn't list the Terabox folder!**\n\n"
+    "The folder is empty, private, or TERABOX_COOKIE is not set."
+)
+
+
+def link_filter_func(_, __, message: Message) -> bool:
+    """Check if a text message contains a link"""
+    return bool(message.text) and _LINK_RE.search(message.text) is not None
+
+
+link_filter = filters.create(link_filter_func)
+
+
+@Client.on_message(filters.private & filters.text & link_filter)
+async def private_link_handler(client: Client, message: Message):
+    """Handle links sent in private chat"""
+    if message.from_user.id in setting_states:
+        # A reply to a /setting prompt (e.g. a title with a URL) - let the settings handler take it
+        message.continue_propagation()
+    
+    logger.info("🔗 Links received from %s", message.from_user.id)
+    
+    await process_user_links(client, message, is_group=False)
+
+
+@Client.on_message(filters.group & filters.text & link_filter)
+async def group_link_handler(client: Client, message: Message):
+    """Handle links in groups (only when the bot is mentioned or replied to)"""
+    if not message.from_user:
+        return
+    
+    bot = await get_bot_info(client)
+    is_mentioned = is_bot_mentioned(message.text)
+    
+    is_reply_to_bot = False
+    if message.reply_to_message and message.reply_to_message.from_user:
+        is_reply_to_bot = message.reply_to_message.from_user.id == bot.id
+    
+    if not (is_mentioned or is_reply_to_bot):
+        return
+    
+    logger.info("🔗 Links received in group from %s", message.from_user.id)
+    
+    await process_user_links(client, message, is_group=True)
+
+
+async def process_user_links(client: Client, message: Message, is_group: bool = False):
+    """Process the links in a text message"""
+    user_id = message.from_user.id
+    username = message.from_user.username
+    
+    if not await admit_user(client, message, is_group):
+        return
+    
+    # Classify each link once; the kind rides along to the downloader. Same dedupe key as
+    # .txt jobs: scheme/host case and a trailing '/' don't make a new link
+    supported_links = []
+    for link in {link_key(link): link for link in iter_links(message.text)}.values():
+        kind = classify_link(link)
+        if kind:
+            supported_links.append((link, kind))
+    
+    if not supported_links:
+        if not is_group:
+            await message.reply_text(NO_SUPPORTED_LINKS_TEXT)
+        return
+    
+    # Shares the per-user lock with .txt jobs: queued jobs see the quota the previous one used
+    lock = queue_manager.locks[user_id]
+    if lock.locked():
+        await message.reply_text(LINK_QUEUED_TEXT, reply_to_message_id=message.id)
+    
+    async with lock:
+        queue_manager.set_processing(user_id, True)
+        # Handlers run on long-lived dispatcher workers: undo the job's context afterwards
+        token = current_user_ctx.set(None)
+        try:
+            await run_link_job(client, message, is_group, user_id, username, supported_links)
+        finally:
+            current_user_ctx.reset(token)
+            queue_manager.set_processing(user_id, False)
+
+
+async def run_link_job(
     client: Client,
-    url: str,
+    message: Message,
+    is_group: bool,
     user_id: int,
     username: str,
-    chat_id: int,
-    reply_to_id: int,
-    progress_message: Message
-) -> tuple:
-    """Download and upload a single link"""
+    supported_links: list
+):
+    """Check quota, then download and upload the links a few at a time"""
+    ctx = await user_db.get_user_context(user_id)
+    current_user_ctx.set(ctx)
+    total = len(supported_links)
+    
+    if not ctx.is_premium:
+        if ctx.remaining <= 0:
+            return await message.reply_text(DAILY_LIMIT_TEXT, reply_markup=PREMIUM_KB)
+        if total > ctx.remaining:
+            return await message.reply_text(
+                LIMIT_EXCEEDED_TMPL.format(links=total, remaining=ctx.remaining),
+                reply_markup=PREMIUM_KB
+            )
+    
+    chat_id = message.chat.id
+    status_msg = await message.reply_text(STARTING_TMPL.format(total=total), reply_to_message_id=message.id)
+    
+    # Pinning costs two RPCs; only worth it for jobs that take a while
+    should_pin = is_group and (
+        total > 1 or any(kind == 'terabox' and is_terabox_folder(link) for link, kind in supported_links)
+    )
+    if should_pin:
+        with contextlib.suppress(Exception):
+            await status_msg.pin(disable_notification=True)
+    
+    status = ThrottledEditor(status_msg)
+    results = JobResults(total=total)
     
-    download_path = create_download_dir(user_id)
-    file_path = None
+    # Log channel entries go out in one batch when the job ends
+    log_entries = []
     
+    # Everything this job downloads lives under its own folder, removed as a whole at the end
+    job_dir = None
     try:
-        logger.info(f"⬇️ Processing: {url[:60]}...")
+        job_dir = await create_download_dir(user_id, uuid.uuid4().hex)
         
-        # Use the unified download router
-        success, file_path, error = await downloader.download(
-            url, download_path, progress_message
-        )
+        # Links are independent: run a few at once. The semaphore bounds the load on
+        # Telegram; status edits are throttled and Pyrogram sleeps out FloodWaits itself.
+        sem = asyncio.Semaphore(Config.LINK_CONCURRENCY)
         
-        # Check for folder marker
-        if success and file_path and file_path.startswith("TERABOX_FOLDER:"):
-            return False, None  # Will be handled separately
+        # Quota left after every link counts once; folder files beyond the first draw from it
+        spare = None if ctx.is_premium else ctx.remaining - total
         
-        if not success or not file_path:
-            logger.error(f"❌ Download failed: {error}")
-            await progress_message.edit_text(f"❌ **Download Failed!**\n\n`{error}`")
-            await uploader.send_log(client, user_id, username, url, "Unknown", "failed", error)
-            return False, None
+        async def handle_one(i: int, link: str, kind: str):
+            nonlocal spare
+            async with sem:
+                await status.edit_text(LINK_TMPL.format(index=i, total=total, link=link[:80]))
+                
+                if kind == 'terabox' and is_terabox_folder(link):
+                    try:
+                        files = await downloader.get_terabox_folder_files(link)
+                        found = len(files)
+                        # No await between reading and taking the quota: concurrent folders can't overdraw it
+                        if spare is not None and found > 1:
+                            files = files[:spare + 1]
+                            spare -= len(files) - 1
+                        await process_terabox_folder(
+                            client, link, files, found, user_id, username, chat_id, message.id, status, ctx,
+                            results, log_entries, job_dir
+                        )
+                    except Exception as e:
+                        logger.error("Folder link error: %s", e)
+                else:
+                    success, file_type = False, None
+                    try:
+                        item = await download_link(client, link, user_id, username, status, kind, ctx, log_entries, job_dir)
+                        if item:
+                            success, file_type = await upload_downloaded(
+                                client, item, user_id, username, chat_id, message.id, status, ctx,
+                                log_entries=log_entries
+                            )
+                    except Exception as e:
+                        logger.error("Link error: %s", e)
+                    results.record(success, file_type)
         
-        # ... rest of the upload logic remains the same
+        await asyncio.gather(*(handle_one(i, link, kind) for i, (link, kind) in enumerate(supported_links, 1)))
+    finally:
+        # Runs even if the job fails or is cancelled: charge what was sent, clean up, report, unpin
+        if not ctx.is_premium and results.success:
+            try:
+                await user_db.increment_usage(user_id, results.success)
+            except Exception:
+                pass
+        
+        await cleanup_file(job_dir)
+        await uploader.send_log_batch(client, user_id, username, log_entries)
+        
+        await status.flush(generate_summary(results))
+        
+        if should_pin:
+            with contextlib.suppress(Exception):
+                await status_msg.unpin()
+
+
+async def process_terabox_folder(
+    client: Client,
+    url: str,
+    files: list,
+    found: int,
+    user_id: int,
+    username: str,
+    chat_id: int,
+    reply_to_id: int,
+    status: ThrottledEditor,
+    ctx: UserContext,
+    results: JobResults,
+    log_entries: list,
+    job_dir: str
+):
+    """Download and upload the listed files of a Terabox folder link (counts each file in results)"""
+    if not files:
+        results.failed += 1
+        await status.edit_text(FOLDER_EMPTY_TEXT)
+        return
+    
+    count = len(files)
+    # The folder link was counted as one task; it stands for all of its files
+    results.total += count - 1
+    if found > count:
+        await status.edit_text(FOLDER_LIMITED_TMPL.format(found=found, count=count))
+    else:
+        await status.edit_text(FOLDER_TMPL.format(count=count))
+    
+    # Downloads overlap each other and the uploads; uploads are capped separately
+    # so Telegram sees the same pressure as a .txt job
+    dl_sem = asyncio.Semaphore(Config.DL_WORKERS)
+    ul_sem = asyncio.Semaphore(Config.UL_WORKERS)
+    
+    async def process_file(i: int, file_info: dict):
+        filename = file_info.get('filename', 'file')
+        download_path = None
+        
+        try:
+            download_path = await create_download_dir(user_id, uuid.uuid4().hex[:12], job_dir)
+            async with dl_sem:
+                await status.edit_text(FOLDER_FILE_TMPL.format(index=i, count=count, filename=filename))
+                success, file_path, error = await downloader.download_terabox_single_file(file_info, download_path, status)
+            if not success or not file_path:
+                logger.error("❌ Folder file download failed: %s", error)
+                log_entries.append((url, filename, "failed", error))
+                await cleanup_file(download_path)
+                results.failed += 1
+                return
+            
+            filename = os.path.basename(file_path)
+            file_size = await asyncio.to_thread(os.path.getsize, file_path)
+            
+            if file_size > ctx.max_size:
+                await cleanup_file(download_path)
+                await status.edit_text(f"❌ File too large! Max: {ctx.max_size_mb}MB")
+                results.failed += 1
+                return
+        except Exception as e:
+            logger.error("Folder download error: %s", e)
+            await cleanup_file(download_path)
+            results.failed += 1
+            return
+        
+        item = {
+            "url": url,
+            "file_path": file_path,
+            "download_path": download_path,
+            "filename": filename,
+            "file_size": file_size,
+            "file_type": get_file_type(get_file_extension(filename))
+        }
+        async with ul_sem:
+            success, file_type = await upload_downloaded(
+                client, item, user_id, username, chat_id, reply_to_id, status, ctx,
+                log_entries=log_entries
+            )
+        results.record(success, file_type)
+    
+    async with asyncio.TaskGroup() as tg:
+        for i, file_info in enumerate(files, 1):
+            tg.create_task(process_file(i, file_info))
+
+logger.info("✅ Link handler loaded successfully!")
@@ -234,7 +234,7 @@ async def handle_setting_input(client: Client, message: Message):
     if state == "waiting_chat_id":
         try:
             chat_id = int(message.text)
-            await user_db.set_chat_id(user_id, chat_id)
+            await user_db.set_setting(user_id, chat_id=chat_id)
             del setting_states[user_id]
             
             await message.reply_text(
@@ -249,7 +249,7 @@ async def handle_setting_input(client: Client, message: Message):
     
     elif state == "waiting_title":
         title = message.text
-        await user_db.set_title(user_id, title)
+        await user_db.set_setting(user_id, title=title)
         del setting_states[user_id]
         
         await message.reply_text(
@@ -264,7 +264,7 @@ async def handle_setting_input(client: Client, message: Message):
         if message.photo:
             # Download thumbnail
             photo = await message.download()
-            await user_db.set_thumbnail(user_id, photo)
+            await user_db.set_setting(user_id, thumbnail=photo)
             del setting_states[user_id]
             
             await message.reply_text(
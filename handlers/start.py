@@ -1,28 +1,22 @@
 import logging
 from pyrogram import Client, filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from pyrogram.errors import UserNotParticipant, ChatAdminRequired
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ChatMemberUpdated
 from config import Config
 from database import db, user_db
+from utils.helpers import check_force_sub, forget_force_sub
 
 logger = logging.getLogger(__name__)
 
-# Force Subscribe Check
-async def force_sub_check(client: Client, user_id: int):
-    """Check if user has joined force subscribe channel"""
-    try:
-        member = await client.get_chat_member(Config.FORCE_SUB_CHANNEL, user_id)
-        if member.status in ["kicked", "banned"]:
-            return False
-        return True
-    except UserNotParticipant:
-        return False
-    except ChatAdminRequired:
-        logger.warning("Bot is not admin in force sub channel!")
-        return True
-    except Exception as e:
-        logger.error(f"Force sub check error: {e}")
-        return True
+# Force Subscribe: drop cached memberships as soon as a user leaves the channel
+@Client.on_chat_member_updated(filters.chat(Config.FORCE_SUB_CHANNEL))
+async def force_sub_member_updated(client: Client, update: ChatMemberUpdated):
+    """Invalidate the force sub cache when a member leaves or is removed"""
+    new = update.new_chat_member
+    if new is None or new.status in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+        member = new or update.old_chat_member
+        if member and member.user:
+            forget_force_sub(member.user.id)
 
 # Start Command
 @Client.on_message(filters.command("start") & filters.private)
@@ -40,7 +34,7 @@ async def start_command(client: Client, message: Message):
         return await message.reply_text("❌ You are banned from using this bot!")
     
     # Check force subscribe
-    if not await force_sub_check(client, user_id):
+    if not await check_force_sub(client, user_id):
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("📢 Join Channel", url=Config.FORCE_SUB_LINK)],
             [InlineKeyboardButton("🔄 Try Again", callback_data="check_sub")]
@@ -141,7 +135,7 @@ async def check_sub_callback(client: Client, callback_query: CallbackQuery):
     """Check subscription callback"""
     user_id = callback_query.from_user.id
     
-    if await force_sub_check(client, user_id):
+    if await check_force_sub(client, user_id):
         await callback_query.answer("✅ Verified! You can use the bot now.", show_alert=True)
         await callback_query.message.delete()
         
@@ -1,8 +1,7 @@
 import asyncio
 import logging
 import os
-from threading import Thread
-from flask import Flask
+from aiohttp import web
 from pyrogram import Client, idle
 from config import Config
 
@@ -16,20 +15,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Flask app for Render port binding
-flask_app = Flask(__name__)
+# Use uvloop when available; must happen before the Client below grabs the event loop
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    logger.info("uvloop not installed, using the default asyncio loop")
 
-@flask_app.route('/')
-def home():
-    return "🤖 Telegram Downloader Bot is Running!"
+# Health routes for Render port binding (served on the bot's own event loop)
+async def home(request):
+    return web.Response(text="🤖 Telegram Downloader Bot is Running!")
 
-@flask_app.route('/health')
-def health():
-    return {"status": "healthy", "message": "Bot is running"}
+async def health(request):
+    return web.json_response({"status": "healthy", "message": "Bot is running"})
 
-def run_flask():
-    """Run Flask server"""
-    flask_app.run(host='0.0.0.0', port=Config.PORT, threaded=True)
+async def start_web_server():
+    """Start the aiohttp health server"""
+    web_app = web.Application()
+    web_app.add_routes([web.get('/', home), web.get('/health', health)])
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', Config.PORT).start()
+    return runner
 
 # Create downloads directory
 os.makedirs(Config.DOWNLOAD_DIR, exist_ok=True)
@@ -40,10 +47,26 @@ app = Client(
     api_id=Config.API_ID,
     api_hash=Config.API_HASH,
     bot_token=Config.BOT_TOKEN,
+    # Not sized from the CPU count: queued jobs hold a worker while they wait on the per-user lock
     workers=50,
+    # Pyrogram allows a single file transfer at a time by default; concurrent uploads would queue
+    max_concurrent_transmissions=Config.MAX_CONCURRENT_TRANSMISSIONS,
     plugins=dict(root="handlers")
 )
 
+def tune_session_storage(client: Client):
+    """Relax sqlite durability on the session file (called once the storage is open)
+    Trade-off: a crash may lose the latest peer/update-state writes; the bot token
+    simply re-authorizes and the peer cache refills, so speed wins over crash safety"""
+    try:
+        conn = getattr(client.storage, "conn", None)
+        if conn is None:
+            return
+        conn.execute("PRAGMA journal_mode=MEMORY")
+        conn.execute("PRAGMA synchronous=OFF")
+    except Exception as e:
+        logger.error(f"Session storage tuning error: {e}")
+
 async def main():
     """Main function to start the bot"""
     
@@ -56,16 +79,18 @@ async def main():
     await user_db.connect()
     logger.info("✅ MongoDB connected!")
     
-    # Start Flask in a separate thread
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    logger.info(f"🌐 Flask server started on port {Config.PORT}")
+    # Start health server
+    web_runner = await start_web_server()
+    logger.info(f"🌐 Web server started on port {Config.PORT}")
     
     # Start the bot
     logger.info("🔄 Starting Telegram bot...")
     await app.start()
+    tune_session_storage(app)
     
-    bot_info = await app.get_me()
+    # Prime the cached bot identity used by the group handlers
+    from utils.helpers import get_bot_info
+    bot_info = await get_bot_info(app)
     logger.info(f"✅ Bot started: @{bot_info.username}")
     logger.info(f"🆔 Bot ID: {bot_info.id}")
     
@@ -89,8 +114,11 @@ async def main():
     
     # Cleanup
     logger.info("🔄 Shutting down...")
+    await web_runner.cleanup()
+    from utils.registry import close_http_sessions
+    await close_http_sessions()
+    await user_db.close()  # flushes buffered usage before the shared client closes
     await db.close()
-    await user_db.close()
     await app.stop()
     logger.info("👋 Bot stopped!")
 
@@ -6,18 +6,23 @@ import asyncio
 import logging
 import requests
 import subprocess
-from typing import Optional, Tuple, List, Dict
+from typing import Callable, Optional, Tuple, List, Dict
 from urllib.parse import unquote, urlparse, quote
 from config import Config
 from utils.progress import Progress
-from utils.helpers import sanitize_filename, extract_gdrive_id
+from utils.helpers import sanitize_filename, extract_gdrive_id, is_terabox_folder
 
 logger = logging.getLogger(__name__)
 
 class Downloader:
-    def __init__(self):
+    def __init__(self, get_session: Optional[Callable[[], requests.Session]] = None):
         self.progress = Progress()
-        self.chunk_size = Config.CHUNK_SIZE
+        self.net_chunk = Config.NET_CHUNK
+        self.disk_chunk = Config.DISK_CHUNK
+        if get_session is None:
+            session = requests.Session()
+            get_session = lambda: session
+        self._get_session = get_session
         
         # Supported platforms by yt-dlp
         self.YTDLP_SITES = [
@@ -85,6 +90,19 @@ class Downloader:
             'drive.usercontent.google.com',
             'storage.googleapis.com',
         ]
+        
+        # Download method per helpers.classify_link() kind - callers that already
+        # classified a link dispatch here instead of re-running the router checks
+        self.download_by_kind = {
+            'gdrive': self.download_gdrive,
+            'terabox': self.download_terabox,
+            'direct': self.download_direct,
+        }
+    
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session for the calling thread (downloads run on executor threads)"""
+        return self._get_session()
     
     def is_ytdlp_supported(self, url: str) -> bool:
         """Check if URL is supported by yt-dlp"""
@@ -115,7 +133,7 @@ class Downloader:
             path = parsed.path.lower()
             direct_exts = ['.pdf', '.zip', '.rar', '.7z', '.apk', '.exe', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.txt']
             return any(path.endswith(ext) for ext in direct_exts)
-        except:
+        except Exception:
             return False
     
     def get_extension_from_content_type(self, content_type: str) -> str:
@@ -188,16 +206,18 @@ class Downloader:
                 return '.html'
             
             return None
-        except:
+        except Exception:
             return None
     
     def validate_download(self, file_path: str, min_size: int = 10000) -> Tuple[bool, str]:
         """Validate downloaded file"""
         try:
-            if not os.path.exists(file_path):
+            # One stat() answers both "exists?" and "how big?"
+            try:
+                size = os.stat(file_path).st_size
+            except FileNotFoundError:
                 return False, "File not found"
             
-            size = os.path.getsize(file_path)
             if size < min_size:
                 return False, f"File too small ({size} bytes)"
             
@@ -228,7 +248,7 @@ class Downloader:
                         "📥 **Downloading with yt-dlp**\n\n"
                         "🔍 Extracting video info..."
                     )
-                except:
+                except Exception:
                     pass
             
             # Output template
@@ -385,7 +405,7 @@ class Downloader:
             
             logger.info(f"📥 Direct downloading: {filename}")
             
-            response = requests.get(url, headers=request_headers, stream=True, timeout=3600, allow_redirects=True)
+            response = self.session.get(url, headers=request_headers, stream=True, timeout=3600, allow_redirects=True)
             
             if response.status_code not in [200, 206]:
                 return False, None, f"HTTP Error: {response.status_code}"
@@ -423,8 +443,9 @@ class Downloader:
             logger.info(f"📥 Saving: {file_path} ({total_size} bytes)")
             
             downloaded = 0
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=self.chunk_size):
+            # Large reads keep the Python-level loop to well under one iteration per MB
+            with open(file_path, 'wb', buffering=self.disk_chunk) as f:
+                for chunk in response.iter_content(chunk_size=self.net_chunk):
                     if chunk:
                         f.write(chunk)
                         downloaded += len(chunk)
@@ -434,7 +455,7 @@ class Downloader:
             if not is_valid:
                 try:
                     os.remove(file_path)
-                except:
+                except Exception:
                     pass
                 return False, None, error
             
@@ -447,11 +468,11 @@ class Downloader:
                     try:
                         os.rename(file_path, new_path)
                         file_path = new_path
-                    except:
+                    except Exception:
                         pass
             
-            final_size = os.path.getsize(file_path)
-            logger.info(f"✅ Downloaded: {file_path} ({final_size} bytes)")
+            # Bytes were counted while writing; renaming doesn't change them
+            logger.info(f"✅ Downloaded: {file_path} ({downloaded} bytes)")
             
             return True, file_path, None
         
@@ -482,7 +503,7 @@ class Downloader:
             if progress_message:
                 try:
                     await progress_message.edit_text("📥 **Downloading from Google Drive...**")
-                except:
+                except Exception:
                     pass
             
             loop = asyncio.get_event_loop()
@@ -502,7 +523,7 @@ class Downloader:
             if progress_message:
                 try:
                     await progress_message.edit_text("🔍 **Analyzing link...**")
-                except:
+                except Exception:
                     pass
             
             # Route 1: Google Drive
@@ -516,7 +537,7 @@ class Downloader:
                 if progress_message:
                     try:
                         await progress_message.edit_text("📥 **Downloading file...**")
-                    except:
+                    except Exception:
                         pass
                 
                 filename = urlparse(url).path.split('/')[-1]
@@ -542,7 +563,7 @@ class Downloader:
             if progress_message:
                 try:
                     await progress_message.edit_text("📥 **Trying direct download...**")
-                except:
+                except Exception:
                     pass
             
             filename = urlparse(url).path.split('/')[-1] or "downloaded_file"
@@ -571,11 +592,7 @@ class Downloader:
     
     async def download_terabox(self, url: str, download_path: str, progress_message) -> Tuple[bool, Optional[str], Optional[str]]:
         """Download from Terabox - uses yt-dlp"""
-        # Check folder
-        url_lower = url.lower()
-        is_folder = 'filelist' in url_lower or ('path=' in url_lower and 'path=%2f' not in url_lower)
-        
-        if is_folder:
+        if is_terabox_folder(url):
             logger.info("📁 Terabox Folder detected")
             return True, "TERABOX_FOLDER:" + url, None
         
@@ -604,7 +621,7 @@ class Downloader:
             try:
                 # Get share info
                 info_url = f"{base}/api/shorturlinfo?shorturl=1{surl}&root=1"
-                response = requests.get(info_url, headers=headers, timeout=30)
+                response = self.session.get(info_url, headers=headers, timeout=30)
                 data = response.json()
                 
                 if data.get('errno') == 0:
@@ -623,7 +640,7 @@ class Downloader:
                         'uk': uk,
                     }
                     
-                    response = requests.get(list_url, headers=headers, params=params, timeout=30)
+                    response = self.session.get(list_url, headers=headers, params=params, timeout=30)
                     data = response.json()
                     
                     if data.get('errno') == 0:
@@ -637,7 +654,7 @@ class Downloader:
                         
                         if files:
                             return files
-            except:
+            except Exception:
                 continue
         
         return files
@@ -661,7 +678,7 @@ class Downloader:
         if progress_message:
             try:
                 await progress_message.edit_text(f"📥 **Downloading**\n\n`{filename}`")
-            except:
+            except Exception:
                 pass
         
         loop = asyncio.get_event_loop()
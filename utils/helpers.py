@@ -3,9 +3,15 @@ import re
 import shutil
 import asyncio
 import aiofiles
+import aiofiles.os
 import logging
-from typing import Optional, List
-from urllib.parse import urlparse, unquote
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, List, Tuple
+from cachetools import TTLCache
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import UserNotParticipant, ChatAdminRequired
+from urllib.parse import urlparse, urlsplit, unquote
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -61,21 +67,17 @@ def get_file_type(extension: str) -> str:
     
     ext = extension.lower()
     
-    video_exts = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mpeg', '.mpg', '.ts']
-    audio_exts = ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus', '.amr']
-    image_exts = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.ico']
-    
-    if ext in video_exts:
+    if ext in Config.VIDEO_EXTENSIONS:
         return "video"
-    elif ext in audio_exts:
+    elif ext in Config.AUDIO_EXTENSIONS:
         return "audio"
-    elif ext in image_exts:
+    elif ext in Config.IMAGE_EXTENSIONS:
         return "image"
     elif ext == '.pdf':
         return "pdf"
     elif ext == '.apk':
         return "apk"
-    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
+    elif ext in Config.ARCHIVE_EXTENSIONS:
         return "archive"
     
     return "document"
@@ -87,7 +89,7 @@ def sanitize_filename(filename: str) -> str:
     
     try:
         filename = unquote(filename)
-    except:
+    except Exception:
         pass
     
     invalid_chars = '<>:"/\\|?*\x00\n\r\t'
@@ -117,22 +119,62 @@ def extract_gdrive_id(url: str) -> Optional[str]:
             return match.group(1)
     return None
 
+GDRIVE_DOMAINS = ('drive.google.com', 'docs.google.com', 'drive.usercontent.google.com', 'storage.googleapis.com')
+TERABOX_DOMAINS = (
+    'terabox.com', 'teraboxapp.com', '1024terabox.com', '1024tera.com',
+    'nephobox.com', 'teraboxurl.com', 'terasharefile.com', 'freeterabox.com',
+    '4funbox.com', 'mirrobox.com', 'momerybox.com', 'terabox.link', 'tbx.to',
+)
+
+# One pass over the URL; the matching group name is the link kind
+_LINK_KIND_RE = re.compile(
+    '(?P<gdrive>' + '|'.join(map(re.escape, GDRIVE_DOMAINS)) + ')'
+    '|(?P<terabox>' + '|'.join(map(re.escape, TERABOX_DOMAINS)) + ')',
+    re.IGNORECASE
+)
+
+_GDRIVE_RE = re.compile('|'.join(map(re.escape, GDRIVE_DOMAINS)), re.IGNORECASE)
+_TERABOX_RE = re.compile('|'.join(map(re.escape, TERABOX_DOMAINS)), re.IGNORECASE)
+
+# Exact host -> kind; one dict lookup settles the common case without the regex
+_HOST_KIND = dict.fromkeys(GDRIVE_DOMAINS, 'gdrive') | dict.fromkeys(TERABOX_DOMAINS, 'terabox')
+
+def classify_link(url: str) -> Optional[str]:
+    """Get link kind: 'gdrive', 'terabox', 'direct' or None if unsupported"""
+    try:
+        host = urlsplit(url).hostname or ''
+    except ValueError:
+        host = ''
+    kind = _HOST_KIND.get(host.removeprefix('www.'))
+    if kind:
+        return kind
+    # Subdomains and links with the domain elsewhere in the URL
+    match = _LINK_KIND_RE.search(url)
+    if match:
+        return match.lastgroup
+    return 'direct' if is_supported_link(url) else None
+
 def is_gdrive_link(url: str) -> bool:
     """Check if Google Drive link"""
-    patterns = ['drive.google.com', 'docs.google.com', 'drive.usercontent.google.com', 'storage.googleapis.com']
-    return any(p in url.lower() for p in patterns)
+    return _GDRIVE_RE.search(url) is not None
 
 def is_terabox_link(url: str) -> bool:
     """Check if Terabox link"""
-    patterns = [
-        'terabox.com', 'teraboxapp.com', '1024terabox.com', '1024tera.com',
-        'nephobox.com', 'teraboxurl.com', 'terasharefile.com', 'freeterabox.com',
-        '4funbox.com', 'mirrobox.com', 'momerybox.com', 'terabox.link', 'tbx.to',
-    ]
-    return any(p in url.lower() for p in patterns)
+    return _TERABOX_RE.search(url) is not None
+
+# Terabox share links that open a folder: 'filelist', or a path= that isn't the root '/'
+_TERABOX_FOLDER_RE = re.compile(r'filelist|path=(?!%2f)', re.IGNORECASE)
+
+def is_terabox_folder(url: str) -> bool:
+    """Check if a Terabox link points to a folder"""
+    return _TERABOX_FOLDER_RE.search(url) is not None
 
 def is_supported_link(url: str) -> bool:
     """Check if URL is from any supported platform"""
+    # Any http/https link is potentially supported by yt-dlp - the common case, so test it first
+    if url.startswith(('http://', 'https://')):
+        return True
+    
     url_lower = url.lower()
     
     # Check known platforms
@@ -152,62 +194,181 @@ def is_supported_link(url: str) -> bool:
         ]
         if any(path.endswith(ext) for ext in supported_exts):
             return True
-    except:
+    except Exception:
         pass
     
-    # Any http/https link is potentially supported by yt-dlp
-    if url.startswith('http://') or url.startswith('https://'):
-        return True
-    
     return False
 
 def is_direct_link(url: str) -> bool:
     """Check if direct download link"""
     return is_supported_link(url)
 
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+def iter_links(text: str):
+    """Yield URLs from text one at a time (no intermediate list)"""
+    for match in _URL_RE.finditer(text):
+        yield match.group(0)
+
 def extract_links_from_text(text: str) -> List[str]:
     """Extract URLs from text"""
-    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-    urls = re.findall(url_pattern, text)
-    return [url.strip() for url in urls if url.strip()]
+    return list(iter_links(text))
+
+_LINK_KEY_RE = re.compile(r'^([a-z][a-z0-9+.-]*://[^/?#]*)', re.IGNORECASE)
+
+def link_key(url: str) -> str:
+    """Dedupe key for a link: scheme/host lowercased, trailing '/' dropped
+    (paths and share ids stay case-sensitive)"""
+    url = url.rstrip('/')
+    return _LINK_KEY_RE.sub(lambda m: m.group(1).lower(), url, count=1)
+
+def iter_txt_links(content: str):
+    """Yield unique links from .txt content, skipping blank and '#' comment lines"""
+    seen = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        for link in iter_links(line):
+            key = link_key(link)
+            if key not in seen:
+                seen.add(key)
+                yield link
+
+def parse_txt_links(content: str) -> List[str]:
+    """Extract unique links from .txt content, skipping blank and '#' comment lines"""
+    return list(iter_txt_links(content))
+
+def classify_txt_bytes(data) -> Tuple[List[Tuple[str, str]], int]:
+    """Decode, dedupe and classify .txt links in one pass (CPU-bound; run it in a thread)
+    Returns the supported (link, kind) pairs and the total number of links found"""
+    links = list(iter_txt_links(str(data, 'utf-8', 'ignore')))
+    # Extracted links are all http(s), so anything not gdrive/terabox is a direct link;
+    # map() keeps the regex scan in C instead of a classify_link() call per link
+    supported = [
+        (link, match.lastgroup if match else 'direct')
+        for link, match in zip(links, map(_LINK_KIND_RE.search, links))
+    ]
+    return supported, len(links)
+
+def parse_txt_bytes(data) -> List[str]:
+    """Decode raw .txt bytes and extract its links (CPU-bound; run it in a thread)"""
+    return parse_txt_links(str(data, 'utf-8', 'ignore'))
 
 async def read_txt_file(file_path: str) -> List[str]:
-    """Read links from txt file"""
+    """Read unique links from a txt file (one read, parsed in a thread)"""
     links = []
     try:
-        async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = await f.read()
-            links = extract_links_from_text(content)
+        async with aiofiles.open(file_path, 'rb') as f:
+            data = await f.read()
+        links = await asyncio.to_thread(parse_txt_bytes, data)
     except Exception as e:
         logger.error(f"Error reading txt: {e}")
     return links
 
-def create_download_dir(user_id: int) -> str:
-    """Create download directory"""
-    user_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
-    os.makedirs(user_dir, exist_ok=True)
-    return user_dir
+# user_id -> download dir already created (the dir itself is never removed while running)
+_DIR_CACHE = {}
 
-async def cleanup_file(file_path: str):
-    """Delete file"""
+async def create_download_dir(user_id: int, task_id: str = None, parent: str = None) -> str:
+    """Create download directory (a per-task subfolder when task_id is given, inside parent if set)"""
+    user_dir = _DIR_CACHE.get(user_id)
+    if user_dir is None:
+        user_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
+        await aiofiles.os.makedirs(user_dir, exist_ok=True)
+        _DIR_CACHE[user_id] = user_dir
+    if not task_id:
+        return user_dir
+    
+    task_dir = os.path.join(parent or user_dir, task_id)
     try:
-        if file_path and os.path.exists(file_path):
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-            elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)
-    except:
+        await aiofiles.os.mkdir(task_dir)
+    except FileNotFoundError:
+        # User dir was removed behind our back; recreate the whole path
+        await aiofiles.os.makedirs(task_dir, exist_ok=True)
+    except FileExistsError:
         pass
+    return task_dir
 
-async def cleanup_user_dir(user_id: int):
-    """Clean user directory"""
+def _remove_path(path: str):
+    """Delete a file or a folder tree (blocking; run it in a thread)"""
     try:
-        user_dir = os.path.join(Config.DOWNLOAD_DIR, str(user_id))
-        if os.path.exists(user_dir):
-            shutil.rmtree(user_dir)
-    except:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except (IsADirectoryError, PermissionError):
+        # unlink() refuses directories (EISDIR on Linux, EPERM on macOS)
+        shutil.rmtree(path, ignore_errors=True)
+
+async def cleanup_file(file_path: str):
+    """Delete file or folder without blocking the event loop (one thread hop)"""
+    try:
+        if not file_path:
+            return
+        await asyncio.to_thread(_remove_path, file_path)
+    except Exception:
         pass
 
+def _remove_trees(paths: List[str]):
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+async def cleanup_dirs(paths: List[str]):
+    """Delete several folders in one worker-thread hop"""
+    if paths:
+        await asyncio.to_thread(_remove_trees, paths)
+
+# The bot's own account never changes while running, so get_me() is called once
+_BOT_INFO = None
+_BOT_MENTION_RE = None
+_BOT_INFO_LOCK = asyncio.Lock()
+
+async def get_bot_info(client):
+    """Get the bot's own User (fetched once, then cached)"""
+    global _BOT_INFO, _BOT_MENTION_RE
+    if _BOT_INFO is not None:
+        return _BOT_INFO
+    async with _BOT_INFO_LOCK:
+        # Concurrent first callers wait here instead of each calling get_me()
+        if _BOT_INFO is None:
+            me = await client.get_me()
+            if me.username:
+                # \b: '@mybot' must not match inside '@mybot_fans'
+                _BOT_MENTION_RE = re.compile(re.escape(f"@{me.username}") + r'\b', re.IGNORECASE)
+            _BOT_INFO = me
+    return _BOT_INFO
+
+def is_bot_mentioned(text: Optional[str]) -> bool:
+    """Check text for '@botusername' in any case, without a lowercased copy
+    (always False before get_bot_info has run)"""
+    return bool(text) and _BOT_MENTION_RE is not None and _BOT_MENTION_RE.search(text) is not None
+
+# Users recently confirmed as channel members; negatives are never cached so a
+# user who just joined gets through on the next try
+_FORCE_SUB_OK = TTLCache(maxsize=Config.FORCE_SUB_CACHE_SIZE, ttl=Config.FORCE_SUB_CACHE_TTL)
+
+async def check_force_sub(client, user_id: int) -> bool:
+    """Check if user has joined the force subscribe channel (memberships cached)"""
+    if user_id in _FORCE_SUB_OK:
+        return True
+    try:
+        member = await client.get_chat_member(Config.FORCE_SUB_CHANNEL, user_id)
+        if member.status in (ChatMemberStatus.BANNED, ChatMemberStatus.LEFT):
+            return False
+        _FORCE_SUB_OK[user_id] = True
+        return True
+    except UserNotParticipant:
+        return False
+    except ChatAdminRequired:
+        logger.warning("Bot is not admin in force sub channel!")
+        return True
+    except Exception as e:
+        logger.error(f"Force sub check error: {e}")
+        return True
+
+def forget_force_sub(user_id: int):
+    """Drop a cached membership (user left or was removed from the channel)"""
+    _FORCE_SUB_OK.pop(user_id, None)
+
 def get_readable_file_size(size_bytes: int) -> str:
     """Convert bytes to readable format"""
     if size_bytes < 1024:
@@ -219,12 +380,29 @@ def get_readable_file_size(size_bytes: int) -> str:
     else:
         return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
 
-def generate_summary(results: dict) -> str:
+@dataclass(slots=True)
+class JobResults:
+    """Counters for one download job (.txt file or link message)"""
+    total: int = 0
+    success: int = 0
+    failed: int = 0
+    file_types: Counter = field(default_factory=Counter)
+    
+    def record(self, success: bool, file_type: Optional[str] = None):
+        """Count one finished file"""
+        if success:
+            self.success += 1
+            if file_type:
+                self.file_types[file_type] += 1
+        else:
+            self.failed += 1
+
+def generate_summary(results: JobResults) -> str:
     """Generate task summary"""
-    total = results.get('total', 0)
-    success = results.get('success', 0)
-    failed = results.get('failed', 0)
-    file_types = results.get('file_types', {})
+    total = results.total
+    success = results.success
+    failed = results.failed
+    file_types = results.file_types
     
     if success == total and total > 0:
         status_msg = "🎉 **All tasks completed successfully!**"
@@ -1,5 +1,7 @@
 import time
+import asyncio
 import logging
+from config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -112,6 +114,69 @@ Done: 〘{self.format_size(current)} of {self.format_size(total)}〙
         return f"📊 **Task Progress:** {current}/{total}\n📁 **Current:** `{filename}`"
 
 
+class ThrottledEditor:
+    """Stands in for a Message: coalesces edit_text calls to one edit per interval"""
+    
+    def __init__(self, message, interval: float = Config.EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._pending = None
+        self._last_text = None
+        self._last_sent = 0.0
+        self._task = None
+        self._waiting = False
+        self._flushing = False
+    
+    async def edit_text(self, text: str, **kwargs):
+        """Queue text for the message; only the newest queued text gets sent"""
+        self._pending = (text, kwargs)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._send_later())
+    
+    async def flush(self, text: str = None, **kwargs):
+        """Send the newest queued text (or the given final text) right away"""
+        if text is not None:
+            self._pending = (text, kwargs)
+        self._flushing = True
+        try:
+            if self._task and not self._task.done():
+                if self._waiting:
+                    self._task.cancel()
+                else:
+                    # Let the edit in flight finish; the loop stops after it
+                    await self._task
+            await self._send()
+        finally:
+            self._flushing = False
+    
+    async def _send_later(self):
+        # Text queued while an edit is in flight is picked up by the next round
+        while self._pending is not None and not self._flushing:
+            delay = self.interval - (time.monotonic() - self._last_sent)
+            if delay > 0:
+                self._waiting = True
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._waiting = False
+            await self._send()
+    
+    async def _send(self):
+        if self._pending is None:
+            return
+        text, kwargs = self._pending
+        self._pending = None
+        if text == self._last_text and not kwargs:
+            return
+        
+        self._last_sent = time.monotonic()
+        try:
+            await self.message.edit_text(text, **kwargs)
+            self._last_text = text
+        except Exception as e:
+            logger.debug(f"Throttled edit error: {e}")
+
+
 # Progress callback for pyrogram
 async def progress_callback(current, total, message, progress_obj, start_time, filename, is_upload=False):
     """Callback function for upload/download progress"""
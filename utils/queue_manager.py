@@ -113,7 +113,7 @@ class QueueManager:
                 task = self.queues[user_id].get_nowait()
                 task.status = "cancelled"
                 count += 1
-            except:
+            except asyncio.QueueEmpty:
                 break
         
         # Mark all user tasks as cancelled
@@ -150,7 +150,7 @@ class QueueManager:
         while not self.queues[user_id].empty():
             try:
                 self.queues[user_id].get_nowait()
-            except:
+            except asyncio.QueueEmpty:
                 break
         
         if user_id in self.active_tasks:
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from utils.downloader import Downloader
+from utils.uploader import Uploader
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive connection pool for the threaded (requests based) download paths. The adapter
+# is thread-safe and shared; Sessions are not, so each thread gets its own on top of it.
+_SYNC_ADAPTER = HTTPAdapter(pool_connections=64, pool_maxsize=64)
+# Sessions serve every user: never keep cookies a server sets (redirects within one request still get them)
+_NO_COOKIES = DefaultCookiePolicy(allowed_domains=[])
+_SYNC_LOCAL = threading.local()
+
+def get_sync_session() -> requests.Session:
+    """Get the calling thread's requests session (backed by the shared pool)"""
+    session = getattr(_SYNC_LOCAL, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _SYNC_ADAPTER)
+        session.mount("http://", _SYNC_ADAPTER)
+        session.cookies.set_policy(_NO_COOKIES)
+        _SYNC_LOCAL.session = session
+    return session
+
+# Process-wide singletons - import these instead of constructing new ones
+downloader = Downloader(get_session=get_sync_session)
+uploader = Uploader()
+
+_HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+_HTTP_LOCK = asyncio.Lock()
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Get the shared aiohttp session (created on first use inside the running loop)"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+        async with _HTTP_LOCK:
+            if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+                _HTTP_SESSION = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=64,
+                        ttl_dns_cache=300,
+                        enable_cleanup_closed=True,
+                        keepalive_timeout=60,
+                    )
+                )
+    return _HTTP_SESSION
+
+async def close_http_sessions():
+    """Close the shared HTTP sessions on shutdown"""
+    global _HTTP_SESSION
+    try:
+        if _HTTP_SESSION is not None and not _HTTP_SESSION.closed:
+            await _HTTP_SESSION.close()
+        _HTTP_SESSION = None
+        _SYNC_ADAPTER.close()
+    except Exception as e:
+        logger.error(f"HTTP session close error: {e}")
@@ -1,7 +1,6 @@
 import os
 import logging
 import asyncio
-import aiohttp
 from PIL import Image
 from typing import Optional
 from config import Config
@@ -109,7 +108,7 @@ class ThumbnailGenerator:
                             img = img.convert('RGB')
                         img.thumbnail((320, 320), Image.Resampling.LANCZOS)
                         img.save(output_path, 'JPEG', quality=85)
-                except:
+                except Exception:
                     pass
                 
                 return output_path
@@ -136,24 +135,26 @@ class ThumbnailGenerator:
             if not self.default_thumbnail:
                 return None
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.default_thumbnail) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        with open(output_path, 'wb') as f:
-                            f.write(content)
-                        
-                        # Resize to proper thumbnail size
-                        try:
-                            with Image.open(output_path) as img:
-                                if img.mode in ('RGBA', 'P'):
-                                    img = img.convert('RGB')
-                                img.thumbnail((320, 320), Image.Resampling.LANCZOS)
-                                img.save(output_path, 'JPEG', quality=85)
-                        except:
-                            pass
-                        
-                        return output_path
+            # Imported here: registry -> uploader -> thumbnail would be circular
+            from utils.registry import get_http_session
+            session = await get_http_session()
+            async with session.get(self.default_thumbnail) as resp:
+                if resp.status == 200:
+                    content = await resp.read()
+                    with open(output_path, 'wb') as f:
+                        f.write(content)
+                    
+                    # Resize to proper thumbnail size
+                    try:
+                        with Image.open(output_path) as img:
+                            if img.mode in ('RGBA', 'P'):
+                                img = img.convert('RGB')
+                            img.thumbnail((320, 320), Image.Resampling.LANCZOS)
+                            img.save(output_path, 'JPEG', quality=85)
+                    except Exception:
+                        pass
+                    
+                    return output_path
             return None
         except Exception as e:
             logger.error(f"Default thumbnail download error: {e}")
@@ -7,7 +7,7 @@ from pyrogram import Client
 from pyrogram.types import Message
 from config import Config
 from utils.progress import Progress
-from utils.helpers import get_readable_file_size, get_file_extension
+from utils.helpers import get_readable_file_size, get_file_extension, get_file_type
 from utils.thumbnail import ThumbnailGenerator
 
 logger = logging.getLogger(__name__)
@@ -84,26 +84,7 @@ class Uploader:
     
     def get_type_from_extension(self, ext: str) -> str:
         """Get file type from extension"""
-        ext = ext.lower()
-        
-        video_exts = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mpeg', '.mpg', '.ts']
-        audio_exts = ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus', '.amr']
-        image_exts = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.ico']
-        
-        if ext in video_exts:
-            return "video"
-        elif ext in audio_exts:
-            return "audio"
-        elif ext in image_exts:
-            return "image"
-        elif ext == '.pdf':
-            return "pdf"
-        elif ext == '.apk':
-            return "apk"
-        elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-            return "archive"
-        
-        return "document"
+        return get_file_type(ext)
     
     async def get_video_metadata(self, file_path: str) -> Tuple[int, int, int]:
         """Get video duration, width, height"""
@@ -133,7 +114,7 @@ class Uploader:
                         return duration, width, height
             
             return 0, 0, 0
-        except:
+        except Exception:
             return 0, 0, 0
     
     async def get_audio_duration(self, file_path: str) -> int:
@@ -144,7 +125,7 @@ class Uploader:
             if audio and hasattr(audio, 'info') and hasattr(audio.info, 'length'):
                 return int(audio.info.length)
             return 0
-        except:
+        except Exception:
             return 0
     
     async def upload_file(
@@ -157,20 +138,24 @@ class Uploader:
         reply_to_message_id: int = None,
         message_thread_id: int = None,
         custom_thumbnail: str = None,
-        file_type: str = None  # This is ignored - we detect from content
+        file_type: str = None,  # This is ignored - we detect from content
+        file_size: int = None  # Known size from the caller skips re-statting the file
     ) -> Tuple[bool, Optional[Message], Optional[str]]:
         """Upload file - detects type from actual content"""
         try:
-            if not os.path.exists(file_path):
-                return False, None, "File not found"
+            if file_size is None:
+                try:
+                    file_size = await asyncio.to_thread(os.path.getsize, file_path)
+                except OSError:
+                    return False, None, "File not found"
             
             filename = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
             
             # DETECT ACTUAL FILE TYPE FROM CONTENT
             actual_type = self.detect_file_type_from_content(file_path)
             
-            logger.info(f"⬆️ Uploading: {filename} ({get_readable_file_size(file_size)}) as {actual_type}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("⬆️ Uploading: %s (%s) as %s", filename, get_readable_file_size(file_size), actual_type)
             
             if caption is None:
                 caption = f"📁 **{filename}**\n📊 Size: {get_readable_file_size(file_size)}"
@@ -182,19 +167,25 @@ class Uploader:
             elif actual_type in ["video", "audio"]:
                 thumbnail = await self.thumbnail_gen.generate_thumbnail(file_path, actual_type)
             
-            # Progress
+            # Progress - throttled per upload: the shared Progress clock let one busy
+            # upload starve every other concurrent upload of updates
             start_time = time.time()
+            update_interval = Config.PROGRESS_UPDATE_INTERVAL
+            next_update = 0.0
             
             async def progress_callback(current, total):
+                nonlocal next_update
                 try:
-                    if self.progress.should_update():
+                    now = time.monotonic()
+                    if now >= next_update:
+                        next_update = now + update_interval
                         elapsed = time.time() - start_time
                         speed = current / elapsed if elapsed > 0 else 0
                         eta = int((total - current) / speed) if speed > 0 else 0
                         
                         text = self.progress.get_upload_progress_text(filename, current, total, speed, eta)
                         await progress_message.edit_text(text)
-                except:
+                except Exception:
                     pass
             
             sent_message = None
@@ -268,7 +259,7 @@ class Uploader:
                             reply_to_message_id=reply_to_message_id,
                             progress=progress_callback
                         )
-                    except:
+                    except Exception:
                         sent_message = await client.send_document(
                             chat_id=chat_id,
                             document=file_path,
@@ -287,7 +278,7 @@ class Uploader:
             
             else:
                 # PDF, APK, Archive, Document - send as document
-                logger.info(f"📄 Uploading as DOCUMENT ({actual_type})")
+                logger.info("📄 Uploading as DOCUMENT (%s)", actual_type)
                 
                 sent_message = await client.send_document(
                     chat_id=chat_id,
@@ -302,7 +293,7 @@ class Uploader:
             if thumbnail and os.path.exists(thumbnail) and thumbnail != custom_thumbnail:
                 try:
                     os.remove(thumbnail)
-                except:
+                except Exception:
                     pass
             
             return True, sent_message, None
@@ -339,3 +330,29 @@ class Uploader:
             await client.send_message(Config.LOG_CHANNEL, log_text)
         except Exception as e:
             logger.error(f"Log error: {e}")
+    
+    async def send_log_batch(self, client: Client, user_id: int, username: str, entries: list):
+        """Send a whole job's (url, filename, status, error) entries as few log messages as possible"""
+        if not entries:
+            return
+        try:
+            header = f"📋 **Batch Log** - @{username or 'None'} (`{user_id}`)\n"
+            messages = []
+            text = header
+            for url, filename, status, error in entries:
+                emoji = "✅" if status == "success" else "❌"
+                url_display = url[:80] + "..." if len(url) > 80 else url
+                line = f"\n{emoji} `{filename}`\n🔗 `{url_display}`\n"
+                if error:
+                    line += f"❌ `{error[:100]}`\n"
+                # Telegram caps a message at 4096 characters
+                if len(text) + len(line) > 4096:
+                    messages.append(text)
+                    text = header
+                text += line
+            messages.append(text)
+            
+            for log_text in messages:
+                await client.send_message(Config.LOG_CHANNEL, log_text)
+        except Exception as e:
+            logger.error(f"Log error: {e}")